@@ -7,15 +7,28 @@ There are 3 different gestures trained:
 flashlights (not too fast)
 """
 
+import copy
+import json
 import pathlib
 import sys
+from functools import partial
 from enum import Enum
+from threading import Lock
 from pyqtgraph.flowchart import Node
-from pyqtgraph.Qt import QtGui
-import pandas as pd
-from sklearn import svm
-from sklearn.exceptions import NotFittedError
+from pyqtgraph.Qt import QtCore, QtGui
 import numpy as np
+from recording_store import open_store
+from compiled_classifier import compile_classifier
+from classifier_models import Aggregation, ClassifierType, create_classifier, is_fitted, \
+    load_cached_classifier, load_classifier_config, predict_recording, save_cached_classifier
+from training_worker import TrainingWorker
+from feature_extraction import extract_features
+from training_set import DEFAULT_CAP, BalancedTrainingSet
+from streaming_prediction import StreamingPredictor
+
+
+# windows of the training set replayed per new window when the incremental classifier learns a new recording
+REPLAY_FACTOR = 6
 
 
 class Mode(Enum):
@@ -32,30 +45,51 @@ class ClassifierNode(Node):
     currently trained data is associated with.
     """
     nodeName = "ClassifierNode"
+    training_done = QtCore.Signal()  # the result of the latest training job was applied or the job failed
 
     def __init__(self, name):
         terminals = {
             'valX': dict(io='in'),
             'valY': dict(io='in'),
             'valZ': dict(io='in'),
+            'spectra': dict(io='in'),  # alternative to the three inputs above: the stacked (3, n) spectra
+            'frames': dict(io='in'),  # alternative to spectra: the (windows, 3, n) spectra of a whole chunk
             'prediction': dict(io='out'),
         }
 
         self.__log_folder = "recorded_actions/"
-        self.__log_file_path = pathlib.Path(self.__log_folder + "/recording.csv")
+        self.__log_file_path = pathlib.Path(self.__log_folder + "/recording.csv")  # old format, only migrated
+        self.__store_folder = pathlib.Path(self.__log_folder + "/store")
+        self.__model_cache_folder = pathlib.Path(self.__log_folder + "/model_cache")
+        self.__training_set_path = self.__model_cache_folder / "training_set.npz"
+        self.__classifier_config_path = pathlib.Path(self.__log_folder + "/classifier_config.json")
         self.__recording_active = False
         self.__activity_name = ""
 
-        self.__recorded_data_X = []
-        self.__recorded_data_Y = []
-        self.__recorded_data_Z = []
-        self.__recorded_data = []  # avg of the 3 input values
+        self.__recorded_spectra = []  # one (3, n) array with the spectra of the x, y and z axis per window
         self.__predicted_action = "Unknown"
+        self.__last_input = None  # the fft nodes repeat the same spectrum object until a new one was calculated
+
+        # the classifier type and parameters chosen by model_selection.py (if it was run), else the defaults
+        best_type, self.classifier_params = load_classifier_config(self.__classifier_config_path)
+        self.classifier_type = best_type or ClassifierType.SVM
+        self.classifier = None  # loaded or trained in the background, see load_or_train_classifier()
+        self.predictor = None  # the classifier used for predictions, see set_classifier()
 
-        self.classifier = svm.SVC(verbose=1)
+        self.training_worker = TrainingWorker()
+        self.training_worker.progress.connect(self.on_training_progress)
+        self.training_worker.finished.connect(self.on_training_finished)
+        self.training_worker.failed.connect(self.on_training_failed)
+        self.__training_job = None  # id of the latest job of the training worker, only its result is used
+        self.__training_set = None  # only used in the training thread
+        self.__replay_rng = np.random.default_rng(0)
+        self.training_set_cap = DEFAULT_CAP
+
+        self.streaming_predictor = StreamingPredictor()
 
         self.__init_record_log()
         self._init_ui()
+        self.load_or_train_classifier()
 
         Node.__init__(self, name, terminals=terminals)
 
@@ -64,20 +98,36 @@ class ClassifierNode(Node):
         if not folder_path.is_dir():
             folder_path.mkdir()
 
-        # check if the file already exists
-        if self.__log_file_path.exists():
-            # load existing recordings
-            self.existing_activity_data = pd.read_csv(self.__log_file_path, sep=";")
-        else:
-            # or create a new csv if no exist
-            self.existing_activity_data = pd.DataFrame(columns=['activity', 'data_avg', 'data_x', 'data_y', 'data_z'])
+        # the store is opened on first use, usually by the background job loading the classifier
+        self.__recording_store = None
+        self.__recording_store_lock = Lock()
+
+    @property
+    def recording_store(self):
+        with self.__recording_store_lock:
+            if self.__recording_store is None:
+                # load the existing recordings from the binary store (or migrate the old csv file once if there is
+                # no store)
+                self.__recording_store = open_store(self.__store_folder, self.__log_file_path)
+            return self.__recording_store
 
     def _save_recorded_data(self):
-        new_recording = {'activity': self.__activity_name, 'data_avg': self.__recorded_data,
-                         'data_x': self.__recorded_data_X, 'data_y': self.__recorded_data_Y,
-                         'data_z': self.__recorded_data_Z}
-        self.existing_activity_data = self.existing_activity_data.append(new_recording, ignore_index=True)
-        # self.existing_activity_data.to_csv(self.__log_file_path, sep=";", index=False)
+        spectra = self._get_recorded_windows()
+        data_avg = spectra.mean(axis=0)  # avg of the 3 axes
+        self.recording_store.add_recording(self.__activity_name, data_avg.ravel(), spectra[0].ravel(),
+                                           spectra[1].ravel(), spectra[2].ravel(), window=spectra.shape[2])
+
+    def _get_recorded_windows(self):
+        """
+        Returns the recorded spectra as (3, windows, n) array. Only spectra with the length of the last one are used,
+        this way the shorter ones at the beginning (while the buffer was still filling up) are ignored.
+        """
+        if not self.__recorded_spectra:
+            return np.empty((3, 0, 0))
+
+        window = self.__recorded_spectra[-1].shape[-1]
+        spectra = [spectrum for spectrum in self.__recorded_spectra if spectrum.shape[-1] == window]
+        return np.stack(spectra, axis=1)
 
     def _init_ui(self):
         self.ui = QtGui.QWidget()
@@ -97,7 +147,8 @@ class ClassifierNode(Node):
                                          "values by clicking on the button \"Start recording\". By clicking the button"
                                          " again the recording is stopped After you have recorded some data and "
                                          "entered a name (i.e. a label) for this activity the recorded data will be "
-                                         "saved in a csv and the classifier will be trained with the recorded data.\n"
+                                         "saved in the recording store and the classifier will be trained with the "
+                                         "recorded data.\n"
                                          "If mode is \"Predict\" you can start recording your accelerometer values as "
                                          "well but this time when you stop the recorded data will be used to predict "
                                          "the activity you most likely performed based on existing activities. The "
@@ -137,6 +188,24 @@ class ClassifierNode(Node):
 
         training_layout.addLayout(training_button_layout)
 
+        classifier_type_layout = QtGui.QHBoxLayout()
+        classifier_type_layout.addWidget(QtGui.QLabel("Classifier:"))
+        self.classifier_type_selection = QtGui.QComboBox()
+        self.classifier_type_selection.addItems([classifier_type.value for classifier_type in ClassifierType])
+        self.classifier_type_selection.setCurrentText(self.classifier_type.value)
+        self.classifier_type_selection.currentTextChanged.connect(self.classifier_type_changed)
+        classifier_type_layout.addWidget(self.classifier_type_selection)
+        training_layout.addLayout(classifier_type_layout)
+
+        cap_layout = QtGui.QHBoxLayout()
+        cap_layout.addWidget(QtGui.QLabel("Max. windows per activity:"))
+        self.training_set_cap_input = QtGui.QSpinBox()
+        self.training_set_cap_input.setRange(10, 100000)
+        self.training_set_cap_input.setValue(self.training_set_cap)
+        self.training_set_cap_input.editingFinished.connect(self.training_set_cap_changed)
+        cap_layout.addWidget(self.training_set_cap_input)
+        training_layout.addLayout(cap_layout)
+
         self.train_text_field = QtGui.QTextEdit()
         self.train_text_field.setReadOnly(True)  # make output field readonly
         training_layout.addWidget(self.train_text_field)
@@ -153,6 +222,42 @@ class ClassifierNode(Node):
         self.predict_button.clicked.connect(self.toggle_prediction_recording)
         prediction_layout.addWidget(self.predict_button)
 
+        aggregation_layout = QtGui.QHBoxLayout()
+        aggregation_layout.addWidget(QtGui.QLabel("Aggregation of the recorded windows:"))
+        self.aggregation_selection = QtGui.QComboBox()
+        self.aggregation_selection.addItems([aggregation.value for aggregation in Aggregation])
+        aggregation_layout.addWidget(self.aggregation_selection)
+        prediction_layout.addLayout(aggregation_layout)
+
+        self.continuous_checkbox = QtGui.QCheckBox("Continuous prediction (classify every window while running)")
+        prediction_layout.addWidget(self.continuous_checkbox)
+
+        streaming_layout = QtGui.QGridLayout()
+        streaming_layout.addWidget(QtGui.QLabel("Vote over last windows:"), 0, 0)
+        self.vote_window_input = QtGui.QSpinBox()
+        self.vote_window_input.setRange(1, 100)
+        self.vote_window_input.setValue(self.streaming_predictor.window_count)
+        self.vote_window_input.valueChanged.connect(self.on_streaming_settings_changed)
+        streaming_layout.addWidget(self.vote_window_input, 0, 1)
+
+        streaming_layout.addWidget(QtGui.QLabel("Votes needed to switch:"), 1, 0)
+        self.min_votes_input = QtGui.QSpinBox()
+        self.min_votes_input.setRange(1, 100)
+        self.min_votes_input.setValue(self.streaming_predictor.min_votes)
+        self.min_votes_input.valueChanged.connect(self.on_streaming_settings_changed)
+        streaming_layout.addWidget(self.min_votes_input, 1, 1)
+
+        streaming_layout.addWidget(QtGui.QLabel("Latency budget per window (ms):"), 2, 0)
+        self.latency_budget_input = QtGui.QDoubleSpinBox()
+        self.latency_budget_input.setRange(0.1, 1000)
+        self.latency_budget_input.setValue(self.streaming_predictor.latency_budget * 1000)
+        self.latency_budget_input.valueChanged.connect(self.on_streaming_settings_changed)
+        streaming_layout.addWidget(self.latency_budget_input, 2, 1)
+        prediction_layout.addLayout(streaming_layout)
+
+        self.latency_label = QtGui.QLabel()
+        prediction_layout.addWidget(self.latency_label)
+
         self.predict_text_field = QtGui.QTextEdit()
         self.predict_text_field.setReadOnly(True)
         prediction_layout.addWidget(self.predict_text_field)
@@ -160,9 +265,48 @@ class ClassifierNode(Node):
         self.prediction_ui.setLayout(prediction_layout)
         self.layout.addWidget(self.prediction_ui)
 
+    def on_streaming_settings_changed(self):
+        self.streaming_predictor.window_count = self.vote_window_input.value()
+        self.streaming_predictor.min_votes = self.min_votes_input.value()
+        self.streaming_predictor.latency_budget = self.latency_budget_input.value() / 1000
+
     def on_activity_name_changed(self, new_text):
         self.__activity_name = new_text
 
+    def classifier_type_changed(self, text):
+        self.classifier_type = ClassifierType(text)
+        self.load_or_train_classifier()
+
+    def training_set_cap_changed(self):
+        if self.training_set_cap_input.value() != self.training_set_cap:
+            self.training_set_cap = self.training_set_cap_input.value()
+            self.load_or_train_classifier()
+
+    def __classifier_hash(self, classifier_type):
+        # the classifier depends on the recordings, the number of windows sampled from them and its parameters
+        params = json.dumps(self.classifier_params.get(classifier_type, {}), sort_keys=True)
+        return f"{self.recording_store.content_hash()}-{self.training_set_cap}-{params}"
+
+    def load_or_train_classifier(self):
+        """
+        Uses the cached classifier of the selected type if it was trained on exactly the current recordings, so
+        predictions are possible right away. Otherwise a new classifier is trained.
+        Both happens in the background, so neither importing scikit-learn nor opening and hashing the recordings
+        delays the ui.
+        """
+        self.__training_job = self.training_worker.start(partial(self._load_or_fit_classifier, self.classifier_type))
+
+    def _load_or_fit_classifier(self, classifier_type, progress=print):
+        cached_classifier = load_cached_classifier(self.__model_cache_folder, classifier_type,
+                                                   self.__classifier_hash(classifier_type))
+        if cached_classifier is not None:
+            progress("Loaded the cached classifier.")
+            return cached_classifier
+
+        if self.recording_store.is_empty():
+            return create_classifier(classifier_type, self.classifier_params.get(classifier_type))
+        return self._fit_classifier(classifier_type, progress)
+
     def mode_changed(self, index):
         self.current_mode = self.mode_selection.currentText()
         print(f"Current index {index}; selection changed {self.current_mode}")
@@ -182,10 +326,7 @@ class ClassifierNode(Node):
             print(f"Mode {self.current_mode} not known!")
 
     def reset_recorded_data(self):
-        self.__recorded_data_X.clear()
-        self.__recorded_data_Y.clear()
-        self.__recorded_data_Z.clear()
-        self.__recorded_data.clear()
+        self.__recorded_spectra.clear()
 
     def show_training_ui(self):
         self.save_button.setEnabled(False)  # disable save button again in case we switched back from other mode
@@ -198,7 +339,7 @@ class ClassifierNode(Node):
     def show_prediction_ui(self):
         self.predict_text_field.clear()
         # show which activities were already recorded:
-        existing_activities = self.existing_activity_data.activity.unique()
+        existing_activities = self.recording_store.activities()
         self.predict_text_field.setHtml(f"Existing recorded activities: {existing_activities}")
 
         self.training_ui.hide()
@@ -225,49 +366,154 @@ class ClassifierNode(Node):
                                           f"<b>You have to enter a name for the recorded activity!</b>")
             return
 
+        if self._get_recorded_windows().shape[1] == 0:
+            self.train_text_field.setHtml(f"{self.get_current_output_text()}\n"
+                                          f"<b>There is no recorded data to save!</b>")
+            return
+
+        if self.training_worker.is_running():
+            self.train_text_field.setHtml(f"{self.get_current_output_text()}\n"
+                                          f"<b>Please wait until the current training has finished!</b>")
+            return
+
         self.train_text_field.setHtml("Saving recorded data...")
         self._save_recorded_data()
 
-        # do the actual training of the classifier
-        self.train_text_field.setHtml(f"{self.get_current_output_text()}\nTraining classifier...")
-        self.train_classifier()
-        self.train_text_field.setHtml(f"{self.get_current_output_text()}\n<b>Finished training!</b>")
+        # do the actual training of the classifier in the background; until it has finished the previous classifier
+        # is still used for predictions
+        self.save_button.setEnabled(False)
+        self.train_text_field.setHtml(f"{self.get_current_output_text()}\nTraining classifier in the background...")
+        if self.__can_update_incrementally():
+            # only learn the new recording instead of refitting on all of them; a copy is trained so the current
+            # classifier stays usable until it is swapped
+            self.__training_job = self.training_worker.start(partial(
+                self._update_classifier, copy.deepcopy(self.classifier), self._get_recorded_windows(),
+                self.__activity_name))
+        else:
+            self.__training_job = self.training_worker.start(partial(self._fit_classifier, self.classifier_type))
 
         self.reset_recorded_data()  # reset the current data so it won't be used for the next recording!
 
-    def train_classifier(self):
-        training_data = []
-        training_labels = []
-
-        for activity_name in self.existing_activity_data.activity.unique():
-            activity_df = self.existing_activity_data.loc[self.existing_activity_data['activity'] == activity_name]
-            avg_values = activity_df["data_avg"]  # TODO use the other values too?
-
-            train_set = []
-            for idx, value in avg_values.items():
-                if len(value) == 0:
-                    continue
-                # parse the string by removing the first two and the last character (this way we can use np.fromstring)
-                first_part = value[1:]
-                second_part = first_part[:-1]
-                val = np.fromstring(second_part, dtype=float, sep=',')
-                train_set.extend(val)
-
-            # make label vector as long as data vector
-            label = [activity_name]
-            len_train_set = len(train_set)
-
-            training_labels.extend(label * len_train_set)
-            training_data.extend(train_set)
-
-        # TODO a cutoff would be helpful to prevent ovefitting if one category has far more data than the others
-
-        if len(training_data) != len(training_labels):
-            print("Problem: lengths not equal!")
+    def on_training_progress(self, message):
+        self.train_text_field.setHtml(f"{self.get_current_output_text()}\n{message}")
+
+    def on_training_finished(self, job, classifier):
+        if job != self.__training_job:
+            # another job was started since (e.g. the classifier type or the cap was changed), so the result is outdated
             return
 
-        training_data = np.array(training_data).reshape(-1, 1)
-        self.classifier.fit(training_data, training_labels)
+        # swap the classifier in one step, so predictions never see a half-trained classifier
+        self.set_classifier(classifier)
+        self.train_text_field.setHtml(f"{self.get_current_output_text()}\n<b>Finished training!</b>")
+        self.__training_job = None
+        self.training_done.emit()
+
+    def on_training_failed(self, job, message):
+        if job != self.__training_job:
+            return
+        self.train_text_field.setHtml(f"{self.get_current_output_text()}\n<b>Training failed:</b> {message}")
+        self.__training_job = None
+        self.training_done.emit()
+
+    def is_training(self):
+        """
+        Returns whether the result of the latest training job was not applied yet.
+        """
+        return self.__training_job is not None
+
+    def wait_for_training(self):
+        """
+        Blocks until the result of the latest training job was applied, the events are processed meanwhile.
+        """
+        loop = QtCore.QEventLoop()
+        self.training_done.connect(loop.quit)
+        if self.is_training():
+            loop.exec_()
+        self.training_done.disconnect(loop.quit)
+
+    def train_classifier(self):
+        """
+        Trains a new classifier of the selected type on all recordings (blocking).
+        """
+        self.__training_job = None  # the results of jobs still running are outdated
+        self.set_classifier(self._fit_classifier(self.classifier_type))
+
+    def update_classifier(self, recorded_spectra, activity_name):
+        """
+        Trains the incremental classifier with a single new recording (blocking).
+        """
+        self.__training_job = None
+        self.set_classifier(self._update_classifier(self.classifier, recorded_spectra, activity_name))
+
+    def set_classifier(self, classifier):
+        """
+        Sets the classifier and compiles it for the predictions if possible (see compiled_classifier.py), so they
+        neither need scikit-learn nor its input validation. Classifiers which can not be compiled predict themselves.
+        """
+        predictor = classifier
+        if is_fitted(classifier):
+            try:
+                predictor = compile_classifier(classifier)
+            except ValueError:
+                pass
+        self.classifier, self.predictor = classifier, predictor
+
+    def _load_training_set(self):
+        """
+        Returns the class-balanced sample of at most training_set_cap windows per activity. Only the recordings added
+        since the training set was saved the last time are read from the store.
+        """
+        return self.__update_training_set().get_data()
+
+    def __update_training_set(self):
+        cap = self.training_set_cap
+        if self.__training_set is None or self.__training_set.cap != cap:
+            self.__training_set = BalancedTrainingSet.load(self.__training_set_path, cap) or BalancedTrainingSet(cap)
+
+        if self.__training_set.update(self.recording_store):
+            self.__model_cache_folder.mkdir(parents=True, exist_ok=True)
+            self.__training_set.save(self.__training_set_path)
+        return self.__training_set
+
+    def _fit_classifier(self, classifier_type, progress=print):
+        classifier = create_classifier(classifier_type, self.classifier_params.get(classifier_type))
+        progress("Loading the recorded activities...")
+        training_data, training_labels = self._load_training_set()
+
+        progress(f"Fitting the classifier on {len(training_data)} windows...")
+        classifier.fit(training_data, training_labels)
+        self.__save_to_cache(classifier_type, classifier)
+        return classifier
+
+    def _update_classifier(self, classifier, recorded_spectra, activity_name, progress=print):
+        """
+        Trains the incremental classifier with a single new recording. Training on the windows of one activity only
+        would make the classifier forget the other ones, so they are mixed with a class-balanced sample of
+        REPLAY_FACTOR times as many windows of the training set; this takes time proportional to the size of the new
+        recording only.
+        """
+        new_data = extract_features(recorded_spectra)
+        replay_data, replay_labels = self.__update_training_set().sample(REPLAY_FACTOR * len(new_data),
+                                                                         self.__replay_rng)
+        progress(f"Updating the classifier with {len(new_data)} new and {len(replay_data)} replayed windows...")
+
+        training_data = np.concatenate([new_data, replay_data])
+        training_labels = np.array([activity_name] * len(new_data) + replay_labels)
+        order = self.__replay_rng.permutation(len(training_data))  # sgd should not see one activity after the other
+        classifier.partial_fit(training_data[order], training_labels[order])
+        self.__save_to_cache(ClassifierType.INCREMENTAL, classifier)  # the only type that can be updated
+        return classifier
+
+    def __save_to_cache(self, classifier_type, classifier):
+        # no recording can be saved during the training, so the classifier matches the current recordings; the hash
+        # is calculated here in the training thread instead of the ui thread
+        save_cached_classifier(self.__model_cache_folder, classifier_type, classifier,
+                               self.__classifier_hash(classifier_type))
+
+    def __can_update_incrementally(self):
+        # the incremental classifier has to know all classes from its first fit, so a new activity needs a full fit
+        return hasattr(self.classifier, "partial_fit") and is_fitted(self.classifier) and \
+            self.__activity_name in self.classifier.classes_
 
     def toggle_prediction_recording(self):
         if self.__recording_active:
@@ -275,26 +521,62 @@ class ClassifierNode(Node):
             self.predict_button.setText("Start recording")
             self.predict_text_field.setHtml(f"{self.get_current_output_text()}\nStopped recording.")
 
-            # predict the most likely activity for the given time-series data
-            self.predict_activity()
+            if self.continuous_checkbox.isChecked():
+                # every window was already classified while running
+                self.show_latency_stats()
+            else:
+                # predict the most likely activity for the given time-series data
+                self.predict_activity()
         else:
+            self.streaming_predictor.reset()
             self.__recording_active = True
             self.predict_button.setText("Stop recording")
             self.predict_text_field.setHtml(f"{self.get_current_output_text()}\nRecording data for prediction...")
 
     def predict_activity(self):
-        try:
-            prediction_data = np.array(self.__recorded_data).reshape(-1, 1)
-            prediction_result = self.classifier.predict(prediction_data)
-            print("Prediction: ", prediction_result)
-            self.__predicted_action = prediction_result[0]
-        except NotFittedError:
+        if not is_fitted(self.predictor):
             sys.stderr.write("The classifier was used to predict before being trained with data!")
             return
 
-        self.predict_text_field.setHtml(f"{self.get_current_output_text()}\n<b>Predicted action!</b>")
+        aggregation = Aggregation(self.aggregation_selection.currentText())
+        try:
+            prediction_data = extract_features(self._get_recorded_windows())
+            label, confidence = predict_recording(self.predictor, prediction_data, aggregation)
+            print(f"Prediction: {label} (confidence {confidence:.2f})")
+            self.__predicted_action = label
+        except ValueError as e:
+            self.predict_text_field.setHtml(f"{self.get_current_output_text()}\n<b>{e}</b>")
+            return
+
+        self.predict_text_field.setHtml(f"{self.get_current_output_text()}\n"
+                                        f"<b>Predicted action: {label} ({confidence:.0%} confidence)</b>")
         self.reset_recorded_data()  # reset the current data so it won't be used for the next prediction!
 
+    def predict_windows(self, windows):
+        """
+        Classifies the (windows, 3, n) spectra of a chunk in continuous mode; the smoothed result is provided on the
+        prediction output.
+        """
+        if not is_fitted(self.predictor):
+            self.__recording_active = False
+            self.predict_button.setText("Start recording")
+            self.predict_text_field.setHtml(f"{self.get_current_output_text()}\n"
+                                            f"<b>The classifier has to be trained first!</b>")
+            return
+
+        windows_before = self.streaming_predictor.get_window_count()
+        self.__predicted_action = self.streaming_predictor.update_chunk(self.predictor, windows)
+
+        if self.streaming_predictor.get_window_count() // 20 != windows_before // 20:
+            self.show_latency_stats()
+
+    def show_latency_stats(self):
+        stats = self.streaming_predictor.get_latency_stats()
+        self.latency_label.setText(f"Latency per window: mean {stats['mean'] * 1000:.2f} ms, "
+                                   f"p95 {stats['p95'] * 1000:.2f} ms, max {stats['max'] * 1000:.2f} ms; "
+                                   f"{stats['windows_over_budget']} of {stats['windows']} windows over budget; "
+                                   f"cost {stats['cost'] * 1000:.2f} ms per window")
+
     def get_current_output_text(self):
         if self.current_mode == Mode.TRAIN.value:
             return self.train_text_field.toHtml()
@@ -307,16 +589,22 @@ class ClassifierNode(Node):
         return self.ui
 
     def process(self, **kwds):
-        if self.__recording_active:
+        frames = kwds.get("frames")
+        spectra = kwds.get("spectra")
+        new_input = next((value for value in (frames, spectra) if value is not None), kwds["valX"])
+        if self.__recording_active and new_input is not self.__last_input:
             # only read in new data during recording phase
-            input_x = kwds["valX"]
-            input_y = kwds["valY"]
-            input_z = kwds["valZ"]
-            input_avg = (input_x + input_y + input_z) / 3
-
-            self.__recorded_data_X.extend(input_x)
-            self.__recorded_data_Y.extend(input_y)
-            self.__recorded_data_Z.extend(input_z)
-            self.__recorded_data.extend(input_avg)
-
+            if frames is not None:
+                windows = np.array(frames)
+            elif spectra is not None:
+                windows = np.array(spectra)[np.newaxis]
+            else:
+                windows = np.stack([kwds["valX"], kwds["valY"], kwds["valZ"]])[np.newaxis]
+
+            if self.current_mode == Mode.PREDICT.value and self.continuous_checkbox.isChecked():
+                self.predict_windows(windows)
+            else:
+                self.__recorded_spectra.extend(windows)
+
+        self.__last_input = new_input
         return {'prediction': self.__predicted_action}
@@ -4,8 +4,9 @@ The whole file was taken from https://github.com/PDA-UR/DIPPID-py.
 
 import sys
 import json
-from threading import Thread
-from time import sleep
+from collections import deque
+from threading import Lock, Thread
+from time import sleep, perf_counter
 from datetime import datetime
 import signal
 
@@ -15,18 +16,47 @@ import signal
 #import serial
 #import wiimote
 
+# use a faster json parser for the fast decoding path if one is installed
+try:
+    import orjson as fast_json
+except ImportError:
+    fast_json = json
+
+# known capabilities whose values are objects with these numeric fields;
+# the fast decoding path extracts them directly into floats
+CAPABILITY_SCHEMAS = {
+    'accelerometer': ('x', 'y', 'z'),
+    'gyroscope': ('x', 'y', 'z'),
+    'gravity': ('x', 'y', 'z'),
+}
+
 class Sensor():
     # class variable that stores all instances of Sensor
     instances = []
 
-    def __init__(self):
-        # list of strings which represent capabilites, such as 'buttons' or 'accelerometer'
-        self._capabilities = []
+    # fast_decoding: use the faster json parser (if installed) and the schemas above;
+    # otherwise every value is compared as a whole like in the original implementation
+    # history_size: if > 0, the last history_size values of every capability are kept
+    # with their arrival time (see drain_samples()), not only the latest one
+    def __init__(self, fast_decoding=True, history_size=0):
+        self._fast_decoding = fast_decoding
+        # strings which represent capabilites, such as 'buttons' or 'accelerometer'
+        # (a dict keeps the insertion order and allows fast lookups)
+        self._capabilities = {}
+        # for each capability with a schema, the last value as tuple of floats (fast decoding only)
+        self._values = {}
         # for each capability, store a list of callback functions
         self._callbacks = {}
         # for each capability, store the last value as an object
         self._data = {}
         self._receiving = False
+        # number of packets received, successfully parsed, merged into a newer packet of the same batch
+        # and dropped because they could not be decoded
+        self._counters = {'received': 0, 'parsed': 0, 'coalesced': 0, 'dropped': 0}
+        # for each capability, the (arrival time, value) of every received value not drained yet
+        self._history_size = history_size
+        self._history = {}
+        self._history_lock = Lock()
         Sensor.instances.append(self)
 
     # stops the loop in _receive() and kills the thread
@@ -41,24 +71,124 @@ class Sensor():
     # receives json formatted data from sensor,
     # stores it and notifies callbacks
     def _update(self, data):
-        try:
-            data_json = json.loads(data)
-        except json.decoder.JSONDecodeError:
-            # incomplete data
+        data_json = self._parse(data)
+        if data_json is None:
             return
 
+        self._record([data_json], perf_counter())
         for key, value in data_json.items():
+            self._set_value(key, value)
+
+    # same as _update() for a whole batch of packets at once:
+    # only the latest value per capability is stored, so callbacks
+    # are notified at most once per capability and batch
+    # (the history still gets every value of the batch)
+    def _update_batch(self, batch):
+        latest_values = {}
+        latest_packets = {}
+        packets = []
+        parsed = 0
+        for data in batch:
+            data_json = self._parse(data)
+            if data_json is None:
+                continue
+
+            packets.append(data_json)
+            for key, value in data_json.items():
+                latest_values[key] = value
+                latest_packets[key] = parsed
+            parsed += 1
+
+        self._record(packets, perf_counter())
+
+        # packets none of whose values are the latest one were coalesced
+        self._counters['coalesced'] += parsed - len(set(latest_packets.values()))
+
+        for key, value in latest_values.items():
+            self._set_value(key, value)
+
+    def _parse(self, data):
+        try:
+            data_json = fast_json.loads(data) if self._fast_decoding else json.loads(data)
+        except ValueError:
+            # incomplete data (json and unicode decode errors are both ValueErrors)
+            self._counters['dropped'] += 1
+            return None
+
+        self._counters['parsed'] += 1
+        return data_json
+
+    def _set_value(self, key, value):
+        if self._fast_decoding and key in CAPABILITY_SCHEMAS and self._set_schema_value(key, value):
+            return
+
+        self._add_capability(key)
+
+        # do not notify callbacks on initialization
+        if self._data[key] == []:
+            self._data[key] = value
+            return
+
+        # notify callbacks only if data has changed
+        if self._data[key] != value:
+            self._data[key] = value
+            self._notify_callbacks(key)
+
+    # fast path for capabilities with a schema: compares the fields as floats
+    # instead of comparing the whole objects; returns False if the value
+    # does not match the schema so the generic path is used instead
+    def _set_schema_value(self, key, value):
+        schema = CAPABILITY_SCHEMAS[key]
+        try:
+            if len(value) != len(schema):
+                return False
+            values = tuple([float(value[field]) for field in schema])
+        except (KeyError, TypeError, ValueError):
+            return False
+
+        if key not in self._capabilities:
             self._add_capability(key)
 
-            # do not notify callbacks on initialization
-            if self._data[key] == []:
-                self._data[key] = value
-                continue
+        previous = self._values.get(key)
+        if previous == values:
+            return True
+
+        self._values[key] = values
+        self._data[key] = dict(zip(schema, values))
+
+        # do not notify callbacks on initialization
+        if previous is not None:
+            self._notify_callbacks(key)
+        return True
 
-            # notify callbacks only if data has changed
-            if self._data[key] != value:
-                self._data[key] = value
-                self._notify_callbacks(key)
+    # appends the values of the given parsed packets to the history of their capabilities;
+    # all packets of a batch get the same arrival time
+    def _record(self, packets, timestamp):
+        if not self._history_size:
+            return
+
+        with self._history_lock:
+            for data_json in packets:
+                for key, value in data_json.items():
+                    if key not in self._history:
+                        # the oldest values are dropped if nobody drains the history
+                        self._history[key] = deque(maxlen=self._history_size)
+                    self._history[key].append((timestamp, value))
+
+    # returns and removes all (arrival time, value) pairs of the specified capability
+    # received since the last call, oldest first (arrival times are from time.perf_counter())
+    def drain_samples(self, key):
+        with self._history_lock:
+            history = self._history.get(key)
+            if not history:
+                return []
+            samples = list(history)
+            history.clear()
+        return samples
+
+    # returns the number of received, parsed, coalesced and dropped packets
+    def get_counters(self):
+        return dict(self._counters)
 
     # checks if capability is available
     def has_capability(self, key):
@@ -66,13 +196,13 @@ class Sensor():
 
     def _add_capability(self, key):
         if not self.has_capability(key):
-            self._capabilities.append(key)
+            self._capabilities[key] = True
             self._callbacks[key] = []
             self._data[key] = []
 
     # returns a list of all current capabilities
     def get_capabilities(self):
-        return self._capabilities
+        return list(self._capabilities)
 
     # get last value for specified capability
     def get_value(self, key):
@@ -105,31 +235,65 @@ class Sensor():
 # initialized with a UDP port
 # listens to all IPs by default
 # requires the socket module
+# in high throughput mode the kernel receive buffer is enlarged and
+# all pending packets are received and parsed as one batch per wakeup
 class SensorUDP(Sensor):
-    def __init__(self, port, ip='0.0.0.0'):
-        Sensor.__init__(self)
+    def __init__(self, port, ip='0.0.0.0', high_throughput=False, receive_buffer_size=4 * 1024 * 1024,
+                 fast_decoding=True, history_size=0):
+        Sensor.__init__(self, fast_decoding, history_size)
         self._ip = ip
         self._port = port
+        self._high_throughput = high_throughput
+        self._receive_buffer_size = receive_buffer_size
         self._connect()
 
     def _connect(self):
         import socket
 
         self._sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        if self._high_throughput:
+            # a larger buffer lets bursts wait in the kernel instead of being dropped silently
+            self._sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, self._receive_buffer_size)
         self._sock.bind((self._ip, self._port))
-        self._connection_thread = Thread(target=self._receive)
+        receive = self._receive_batched if self._high_throughput else self._receive
+        self._connection_thread = Thread(target=receive)
         self._connection_thread.start()
 
     def _receive(self):
         self._receiving = True
         while self._receiving:
             data, addr = self._sock.recvfrom(1024)
+            self._counters['received'] += 1
             try:
                 data_decoded = data.decode()
             except UnicodeDecodeError:
+                self._counters['dropped'] += 1
                 continue
             self._update(data_decoded)
 
+    def _receive_batched(self):
+        import select
+
+        self._receiving = True
+        self._sock.setblocking(False)
+        while self._receiving:
+            # wait with a timeout, so disconnect() does not hang if no packets arrive
+            readable, _, _ = select.select([self._sock], [], [], 0.1)
+            if not readable:
+                continue
+
+            # drain the socket: receive all packets that are pending right now
+            batch = []
+            while True:
+                try:
+                    data, addr = self._sock.recvfrom(1024)
+                except (BlockingIOError, InterruptedError):
+                    break
+                batch.append(data)
+
+            self._counters['received'] += len(batch)
+            self._update_batch(batch)
+
 # sensor connected via serial connection (USB)
 # initialized with a path to a TTY (e.g. /dev/ttyUSB0)
 # default baudrate is 115200
@@ -0,0 +1,195 @@
+"""
+asyncio based backend for DIPPID sensors connected via WiFi/UDP.
+
+Other than SensorUDP, an AsyncSensorUDP does not start a thread of its own: any number of sensors receive their
+packets in a single asyncio event loop. The register_callback()/get_value() API is the same as for the other sensors;
+additionally the values of a capability can be consumed as an asynchronous stream:
+
+    sensor = AsyncSensorUDP(5700)
+    await sensor.connect()
+    async for value in sensor.stream('accelerometer'):
+        print(value)
+
+For code without an event loop of its own (e.g. the Qt ui), SensorLoop runs a shared event loop in one background
+thread and creates the sensors in it.
+"""
+
+import asyncio
+import time
+from threading import Thread
+from DIPPID import Sensor
+
+
+# put into the queue of a stream to end it; None can't be used as it is a valid (json null) value
+_END_OF_STREAM = object()
+
+
+class _SensorProtocol(asyncio.DatagramProtocol):
+    def __init__(self, sensor):
+        self._sensor = sensor
+
+    def datagram_received(self, data, addr):
+        self._sensor._datagram_received(data)
+
+
+class AsyncSensorUDP(Sensor):
+    """
+    DIPPID sensor receiving its packets via an asyncio datagram endpoint on the given port.
+    Streams buffer at most stream_size values; if a consumer is too slow, the oldest values are dropped (counted as
+    stream_overflow, other than the dropped packets which could not be decoded).
+    """
+
+    def __init__(self, port, ip='0.0.0.0', fast_decoding=True, stream_size=1000, history_size=0):
+        Sensor.__init__(self, fast_decoding, history_size)
+        self._ip = ip
+        self._port = port
+        self._stream_size = stream_size
+        self._connection_thread = None
+        self._transport = None
+        self._loop = None
+        self._streams = {}  # queue of every active stream -> capability it streams
+        self._counters['stream_overflow'] = 0
+
+    async def connect(self):
+        self._loop = asyncio.get_running_loop()
+        self._transport, _ = await self._loop.create_datagram_endpoint(lambda: _SensorProtocol(self),
+                                                                       local_addr=(self._ip, self._port))
+        self._receiving = True
+
+    def disconnect(self):
+        """
+        Closes the endpoint and ends all streams; can be called from any thread.
+        """
+        self._receiving = False
+        if self in Sensor.instances:
+            Sensor.instances.remove(self)
+
+        if self._loop is None or self._loop.is_closed():
+            return
+        if self._loop.is_running():
+            self._loop.call_soon_threadsafe(self.__close)
+        else:
+            self.__close()
+
+    def __close(self):
+        if self._transport is not None:
+            self._transport.close()
+            self._transport = None
+
+        for queue in self._streams:
+            self.__put(queue, _END_OF_STREAM)
+
+    def _datagram_received(self, data):
+        self._counters['received'] += 1
+        data_json = self._parse(data)
+        if data_json is None:
+            return
+
+        self._record([data_json], time.perf_counter())
+        for key, value in data_json.items():
+            self._set_value(key, value)
+
+        for queue, key in self._streams.items():
+            if key in data_json:
+                self.__put(queue, self._data[key])
+
+    def __put(self, queue, value):
+        if queue.full():
+            # the consumer can't keep up, so drop the oldest value
+            queue.get_nowait()
+            self._counters['stream_overflow'] += 1
+        queue.put_nowait(value)
+
+    async def stream(self, key):
+        """
+        Asynchronously yields every new value of the given capability until the sensor is disconnected; ends right
+        away if it is not connected (anymore).
+        """
+        if not self._receiving or self._transport is None:
+            # nothing would end the stream otherwise
+            return
+
+        queue = asyncio.Queue(maxsize=self._stream_size)
+        self._streams[queue] = key
+        try:
+            while True:
+                value = await queue.get()
+                if value is _END_OF_STREAM:
+                    return
+                yield value
+        finally:
+            del self._streams[queue]
+
+
+class SensorLoop:
+    """
+    Runs one asyncio event loop in a background thread which is shared by all sensors created with add_sensor().
+    stop() disconnects all sensors, lets the running tasks finish (or cancels them) and ends the thread.
+    """
+
+    def __init__(self):
+        self._loop = asyncio.new_event_loop()
+        self._thread = Thread(target=self.__run, name="dippid-loop", daemon=True)
+        self._sensors = []
+        self._thread.start()
+
+    def __run(self):
+        asyncio.set_event_loop(self._loop)
+        self._loop.run_forever()
+
+        # cancel what is left after the loop was stopped and let the cancellation finish
+        tasks = asyncio.all_tasks(self._loop)
+        for task in tasks:
+            task.cancel()
+        self._loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+        self._loop.close()
+
+    @property
+    def loop(self):
+        return self._loop
+
+    def add_sensor(self, port, ip='0.0.0.0', **kwargs):
+        """
+        Creates and connects an AsyncSensorUDP in the shared loop (blocks until it is connected).
+        """
+        sensor = AsyncSensorUDP(port, ip, **kwargs)
+        asyncio.run_coroutine_threadsafe(sensor.connect(), self._loop).result()
+        self._sensors.append(sensor)
+        return sensor
+
+    def run(self, coroutine):
+        """
+        Schedules a coroutine in the shared loop and returns a concurrent.futures.Future for its result.
+        """
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop)
+
+    def stop(self, timeout=1.0):
+        """
+        Disconnects all sensors, waits up to timeout seconds for the running tasks (e.g. consumers of the streams) to
+        finish and cancels the ones left.
+        """
+        if self._loop.is_running():
+            asyncio.run_coroutine_threadsafe(self.__shutdown(timeout), self._loop).result()
+            self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+
+    async def __shutdown(self, timeout):
+        for sensor in self._sensors:
+            sensor.disconnect()
+        self._sensors.clear()
+
+        tasks = asyncio.all_tasks() - {asyncio.current_task()}
+        if tasks:
+            await asyncio.wait(tasks, timeout=timeout)
+
+
+if __name__ == '__main__':
+    import sys
+
+    async def print_accelerometer(port):
+        sensor = AsyncSensorUDP(port)
+        await sensor.connect()
+        async for value in sensor.stream('accelerometer'):
+            print(value)
+
+    asyncio.run(print_accelerometer(int(sys.argv[1]) if len(sys.argv) > 1 else 5700))
@@ -13,15 +13,18 @@ from pyqtgraph.Qt import QtGui, QtCore
 import pyqtgraph as pg
 import numpy as np
 from DIPPID import SensorUDP
+from ring_buffer import RingBuffer
 import sys
 
 
 class BufferNode(Node):
     """
     Buffers the last n samples provided on input and provides them as a list of
-    length n on output.
+    length n on output, together with the number of samples that were new (see FFTNode).
     A spinbox widget allows for setting the size of the buffer.
     Default size is 32 samples.
+    The samples are kept in a preallocated ring buffer, so neither single samples nor whole chunks of samples on
+    the input cause a new allocation. The output is a read-only view of the buffer in chronological order.
     """
     nodeName = "Buffer"
 
@@ -29,16 +32,25 @@ class BufferNode(Node):
         terminals = {
             'dataIn': dict(io='in'),
             'dataOut': dict(io='out'),
+            'newSamples': dict(io='out'),
         }
 
-        self.buffer_size = 32
-        self._buffer = np.array([])
+        self._buffer = RingBuffer(32)
         Node.__init__(self, name, terminals=terminals)
 
+    @property
+    def buffer_size(self):
+        return self._buffer.size
+
+    @buffer_size.setter
+    def buffer_size(self, size):
+        self._buffer.resize(size)
+
     def process(self, **kwds):
-        self._buffer = np.append(self._buffer, kwds['dataIn'])[-self.buffer_size:]
+        samples = np.asarray(kwds['dataIn'])
+        self._buffer.extend(samples)
 
-        return {'dataOut': self._buffer}
+        return {'dataOut': self._buffer.view(), 'newSamples': samples.size}
 
 fclib.registerNodeType(BufferNode, [('Data',)])
 
@@ -53,10 +65,16 @@ class DIPPIDNode(Node):
     Update rate can be changed via a spinbox widget. Setting it to "0"
     activates callbacks every time a new sensor value arrives (which is
     quite often -> performance hit)
+    On every update, all samples received since the previous update are output
+    at once as arrays (chunks), so no samples are lost between two updates
+    whatever the update rate is.
     """
 
     nodeName = "DIPPID"
 
+    # samples kept per capability between two updates; enough for several seconds at high sensor rates
+    HISTORY_SIZE = 4096
+
     def __init__(self, name):
         terminals = {
             'accelX': dict(io='out'),
@@ -65,7 +83,8 @@ class DIPPIDNode(Node):
         }
 
         self.dippid = None
-        self._acc_vals = []
+        self._acc_vals = np.zeros((3, 0))
+        self.instrumentation = None  # optional, see instrumentation.py
 
         self._init_ui()
 
@@ -109,16 +128,34 @@ class DIPPIDNode(Node):
         if self.dippid is None or not self.dippid.has_capability('accelerometer'):
             return
 
-        v = self.dippid.get_value('accelerometer')
-        self._acc_vals = [v['x'], v['y'], v['z']]
+        samples = self.dippid.drain_samples('accelerometer')
+        if self.instrumentation is not None:
+            self.instrumentation.record_queue_depth("sensor", len(samples))
+        if not samples:
+            return
+        if self.instrumentation is not None:
+            self.instrumentation.mark_arrival(samples[0][0], samples[-1][0])
+
+        # malformed packets are skipped instead of losing the whole chunk
+        vectors = [vector for vector in (self._to_vector(value) for _, value in samples) if vector is not None]
+        if not vectors:
+            return
+        self._acc_vals = np.array(vectors, dtype=float).T
 
         self.update()
 
+    @staticmethod
+    def _to_vector(value):
+        try:
+            return float(value['x']), float(value['y']), float(value['z'])
+        except (KeyError, TypeError, ValueError):
+            return None
+
     def update_accel(self, acc_vals):
         if not self.dippid.has_capability('accelerometer'):
             return
 
-        self._acc_vals = [acc_vals['x'], acc_vals['y'], acc_vals['z']]
+        self._acc_vals = np.array([[acc_vals['x']], [acc_vals['y']], [acc_vals['z']]], dtype=float)
         self.update()
 
     def ctrlWidget(self):
@@ -129,7 +166,8 @@ class DIPPIDNode(Node):
             return
 
         self.connect_button.setText("connecting...")
-        self.dippid = SensorUDP(int(self.text.text().strip()))
+        self.dippid = SensorUDP(int(self.text.text().strip()), high_throughput=True,
+                                history_size=self.HISTORY_SIZE)
 
         if self.dippid is None:
             self.connect_button.setText("try again")
@@ -148,10 +186,10 @@ class DIPPIDNode(Node):
         if rate == 0:
             self.update_timer.stop()
         else:
-            self.update_timer.start(1000 / rate)
+            self.update_timer.start(int(1000 / rate))
 
     def process(self, **kwdargs):
-        return {'accelX': np.array([self._acc_vals[0]]), 'accelY': np.array([self._acc_vals[1]]), 'accelZ': np.array([self._acc_vals[2]])}
+        return {'accelX': self._acc_vals[0], 'accelY': self._acc_vals[1], 'accelZ': self._acc_vals[2]}
 
 fclib.registerNodeType(DIPPIDNode, [('Sensor',)])
 
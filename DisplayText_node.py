@@ -13,6 +13,7 @@ class DisplayTextNode(Node):
             'prediction': dict(io='in')
         }
 
+        self.instrumentation = None  # optional, records the latency until the prediction is shown
         self._show_ui()
         Node.__init__(self, name, terminals=terminals)
 
@@ -32,3 +33,5 @@ class DisplayTextNode(Node):
     def process(self, **kwds):
         predicted_activity = kwds["prediction"]
         self.predicted_class.setText(f"Predicted activity:  {predicted_activity}")
+        if self.instrumentation is not None:
+            self.instrumentation.record_prediction()
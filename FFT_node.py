@@ -1,21 +1,308 @@
+from functools import lru_cache
 from pyqtgraph.flowchart import Node
+from pyqtgraph.Qt import QtGui
 import numpy as np
-from scipy import fft
+from numpy.lib.stride_tricks import sliding_window_view
+from ring_buffer import RingBuffer
 
 
-class FFTNode(Node):
+WINDOW_FUNCTIONS = {
+    "rectangular": np.ones,
+    "hann": np.hanning,
+    "hamming": np.hamming,
+    "blackman": np.blackman,
+}
+
+
+@lru_cache(maxsize=32)
+def _window_coefficients(window, n):
+    # the coefficients are cached per window type and length, so they are only calculated once
+    coefficients = WINDOW_FUNCTIONS[window](n)
+    coefficients.flags.writeable = False
+    return coefficients
+
+
+@lru_cache(maxsize=32)
+def _twiddle_factors(n):
+    # e^(j*2*pi*k/n) for all bins k of the real fft, needed to shift the sliding dft by one sample
+    factors = np.exp(2j * np.pi * np.arange(n // 2 + 1) / n)
+    factors.flags.writeable = False
+    return factors
+
+
+class SpectrumEstimator:
+    """
+    Calculates the single-sided amplitude spectrum of a window of samples (or of several windows at once, stacked
+    along the first axes) that moves forward by one sample on every call of update().
+
+    hop_size: the spectrum is only recalculated every hop_size samples, in between the previous spectrum (the very
+    same array object) is returned.
+    window: name of the window function applied before the fft, one of WINDOW_FUNCTIONS.
+    sliding: instead of a full fft, the bins are updated incrementally with a sliding DFT which takes O(n) per
+    sample. This requires the rectangular window; the bins are recalculated from scratch every n samples to prevent
+    rounding errors from accumulating.
+    """
+
+    def __init__(self, hop_size=1, window="rectangular", sliding=False):
+        self._hop_size = 1
+        self._window = "rectangular"
+        self._sliding = False
+
+        self.hop_size = hop_size
+        self.window = window
+        self.sliding = sliding
+
+        self.reset()
+
+    @property
+    def hop_size(self):
+        return self._hop_size
+
+    @hop_size.setter
+    def hop_size(self, hop_size):
+        if hop_size < 1:
+            raise ValueError(f"The hop size has to be at least 1 but was {hop_size}!")
+        self._hop_size = int(hop_size)
+
+    @property
+    def window(self):
+        return self._window
+
+    @window.setter
+    def window(self, window):
+        if window not in WINDOW_FUNCTIONS:
+            raise ValueError(f"Window function {window} not known!")
+        if self._sliding and window != "rectangular":
+            raise ValueError("The sliding DFT only supports the rectangular window!")
+        self._window = window
+        self.reset()
+
+    @property
+    def sliding(self):
+        return self._sliding
+
+    @sliding.setter
+    def sliding(self, sliding):
+        if sliding and self._window != "rectangular":
+            raise ValueError("The sliding DFT only supports the rectangular window!")
+        self._sliding = bool(sliding)
+        self.reset()
+
+    @property
+    def spectrum(self):
+        """
+        The last calculated spectrum (None if there is none yet).
+        """
+        return self._spectrum
+
+    def reset(self):
+        self._spectrum = None
+        self._shape = None  # the shape of the last window
+        self._bins = None  # complex bins of the sliding dft
+        self._oldest = None  # the oldest sample(s) of the last window, i.e. the next one(s) to drop out
+        self._samples_since_spectrum = 0
+        self._samples_since_full_dft = 0
+
+    def update(self, input_values):
+        """
+        Returns the amplitude spectrum of the given window which has to be one sample ahead of the previous one.
+        """
+        n = input_values.shape[-1]
+        length_changed = input_values.shape != self._shape
+        self._shape = input_values.shape
+        self._samples_since_spectrum += 1
+
+        if self._sliding:
+            self._update_bins(input_values, reinitialize=length_changed)
+
+        if length_changed or self._samples_since_spectrum >= self._hop_size:
+            self._samples_since_spectrum = 0
+            if self._sliding:
+                self._spectrum = np.abs(self._bins / n)[..., 1:n // 2]
+            else:
+                self._spectrum = self._calculate_fft(input_values)
+
+        return self._spectrum
+
+    def update_frames(self, windows):
+        """
+        Same as calling update() for each of the given (frames, ..., n) windows, each one sample ahead of the
+        previous one, but the due spectra are calculated with a single batched fft. Returns the spectra of the
+        windows at which a new spectrum was due according to the hop size, stacked along the first axis.
+        """
+        n = windows.shape[-1]
+        empty = np.empty((0,) + windows.shape[1:-1] + (max(n // 2 - 1, 0),))
+        if len(windows) == 0:
+            return empty
+
+        if self._sliding:
+            # the sliding dft has to go through all samples one by one anyway
+            spectra = []
+            for window in windows:
+                previous = self._spectrum
+                spectrum = self.update(window)
+                if spectrum is not previous:
+                    spectra.append(spectrum)
+            return np.stack(spectra) if spectra else empty
+
+        # the first spectrum is due in the window reaching the hop size (or right away if the shape changed)
+        length_changed = windows.shape[1:] != self._shape
+        self._shape = windows.shape[1:]
+        first = 0 if length_changed else max(self._hop_size - self._samples_since_spectrum - 1, 0)
+        due = np.arange(first, len(windows), self._hop_size)
+        if len(due) == 0:
+            self._samples_since_spectrum += len(windows)
+            return empty
+
+        self._samples_since_spectrum = len(windows) - 1 - due[-1]
+        spectra = self._calculate_fft(windows[due])
+        self._spectrum = spectra[-1]
+        return spectra
+
+    def _calculate_fft(self, input_values):
+        """
+        Calculates the fft for the given accelerometer values.
+        We use only half of the input values length to ignore the imaginary part.
+
+        Formula taken from the provided Wiimote-FFT-SVM.ipynb notebook; as the input is real, the real fft is
+        sufficient and already omits the mirrored half of the spectrum. The amplitudes are normalized by the sum
+        of the window coefficients which equals n for the rectangular window.
+        """
+        from scipy import fft  # imported on first use to speed up the start
+
+        n = input_values.shape[-1]
+        if n // 2 <= 1:
+            # no bins besides the dc component; the coefficients of short tapered windows may even sum up to 0
+            return np.empty(input_values.shape[:-1] + (0,))
+
+        coefficients = _window_coefficients(self._window, n)
+        if self._window != "rectangular":
+            input_values = input_values * coefficients
+        return np.abs(fft.rfft(input_values, axis=-1) / coefficients.sum())[..., 1:n // 2]
+
+    def _update_bins(self, input_values, reinitialize):
+        n = input_values.shape[-1]
+        if reinitialize or self._bins is None or self._samples_since_full_dft >= n:
+            from scipy import fft
+
+            self._bins = fft.rfft(input_values, axis=-1)
+            self._samples_since_full_dft = 0
+        else:
+            # X_k(t) = e^(j*2*pi*k/n) * (X_k(t-1) - x(t-n) + x(t))
+            self._bins = (self._bins + (input_values[..., -1] - self._oldest)[..., np.newaxis]) * _twiddle_factors(n)
+            self._samples_since_full_dft += 1
+
+        self._oldest = np.array(input_values[..., 0])
+
+
+def process_chunk(buffer, estimator, chunk):
+    """
+    Appends a (..., k) chunk of new samples to the ring buffer and updates the estimator as if the samples had
+    arrived one by one. Returns the (frames, ..., bins) spectra that were due within the chunk.
+
+    Once the buffer is full, all windows ending in the chunk are views into the last n - 1 buffered samples
+    followed by the chunk, so their spectra are calculated at once. While the buffer is still filling up, the
+    windows grow with every sample and are therefore passed to the estimator one at a time; only the spectrum of
+    the window filling up the buffer is returned, the others are shorter than the ones of a full buffer.
+    """
+    n = buffer.size
+    frames = np.empty((0,) + chunk.shape[:-1] + (max(n // 2 - 1, 0),))
+
+    filling = min(chunk.shape[-1], n - len(buffer))
+    for i in range(filling):
+        buffer.extend(chunk[..., i])
+        estimator.update(buffer.view())
+    if filling and buffer.is_full():
+        # the window that filled up the buffer is the first full one (always calculated as its length changed)
+        frames = estimator.spectrum[np.newaxis]
+
+    rest = chunk[..., filling:]
+    if rest.shape[-1] == 0:
+        return frames
+
+    history = np.concatenate([buffer.view()[..., len(buffer) - (n - 1):], rest], axis=-1)
+    windows = np.moveaxis(sliding_window_view(history, n, axis=-1), -2, 0)  # (frames, ..., n)
+    new_frames = estimator.update_frames(windows)
+    buffer.extend(rest)
+    return np.concatenate([frames, new_frames]) if len(frames) else new_frames
+
+
+class SpectrumNode(Node):
+    """
+    Base class for the fft nodes; provides the configuration of the hop size, the window function and the sliding
+    DFT in the control pane.
+    """
+
+    def __init__(self, name, terminals):
+        self._estimator = SpectrumEstimator()
+        self._init_ui()
+        Node.__init__(self, name, terminals=terminals)
+
+    def _init_ui(self):
+        self.ui = QtGui.QWidget()
+        self.layout = QtGui.QGridLayout()
+
+        label = QtGui.QLabel("Hop size (samples):")
+        self.layout.addWidget(label)
+
+        self.hop_size_input = QtGui.QSpinBox()
+        self.hop_size_input.setMinimum(1)
+        self.hop_size_input.setMaximum(1024)
+        self.hop_size_input.setValue(self._estimator.hop_size)
+        self.hop_size_input.valueChanged.connect(self.set_hop_size)
+        self.layout.addWidget(self.hop_size_input)
+
+        label2 = QtGui.QLabel("Window function:")
+        self.layout.addWidget(label2)
+
+        self.window_selection = QtGui.QComboBox()
+        self.window_selection.addItems(list(WINDOW_FUNCTIONS.keys()))
+        self.window_selection.currentTextChanged.connect(self.set_window)
+        self.layout.addWidget(self.window_selection)
+
+        self.sliding_checkbox = QtGui.QCheckBox("Sliding DFT (incremental update)")
+        self.sliding_checkbox.toggled.connect(self.set_sliding)
+        self.layout.addWidget(self.sliding_checkbox)
+
+        self.ui.setLayout(self.layout)
+
+    def ctrlWidget(self):
+        return self.ui
+
+    def set_hop_size(self, hop_size):
+        self._estimator.hop_size = hop_size
+
+    def set_window(self, window):
+        self._estimator.window = window
+
+    def set_sliding(self, sliding):
+        if sliding:
+            # the sliding dft can only be used without a window function
+            self.window_selection.setCurrentText("rectangular")
+        self.window_selection.setEnabled(not sliding)
+        self._estimator.sliding = sliding
+
+
+class FFTNode(SpectrumNode):
     """
     Calculates the Fast Fourier Transformation (FFT) for the provided time-series data and the returns the
     frequency spectrum for the given signal.
+
+    The window on the input may be several samples ahead of the previous one (e.g. a BufferNode receiving chunks);
+    the number of new samples is taken from newSamples (1 if it is not connected). The new samples are passed to
+    the estimator one by one like in the MultiChannelFFTNode, so the hop size counts samples and the sliding DFT
+    stays in sync. If the window does not continue the previous one, the estimator starts over with it.
     """
     nodeName = "FFTNode"
 
     def __init__(self, name):
         terminals = {
             'accelIn': dict(io='in'),
+            'newSamples': dict(io='in'),
             'spectrumOut': dict(io='out'),
         }
-        Node.__init__(self, name, terminals=terminals)
+        self._buffer = RingBuffer(32)
+        SpectrumNode.__init__(self, name, terminals=terminals)
 
     def _plot_spectrum(self, y, Fs):
         """ Plots a Single-Sided Amplitude Spectrum of y(t);
@@ -25,6 +312,8 @@ class FFTNode(Node):
 
         Function taken from the provided dft_tour.ipynb notebook.
         """
+        from scipy import fft
+
         n = len(y)  # length of the signal
         k = np.arange(n)
         T = n / Fs
@@ -37,17 +326,75 @@ class FFTNode(Node):
         # xlabel('Frequency (Hz)')
         # ylabel('Intensity')
 
-    def _calculate_fft(self, input_values):
-        """
-        Calculates the fft for the given accelerometer values.
-        We use only half of the input values length to ignore the imaginary part.
+    def process(self, **kwds):
+        window = np.asarray(kwds["accelIn"], dtype=float)
+        n = window.shape[-1]
+        new_samples = min(1 if kwds.get("newSamples") is None else int(kwds["newSamples"]), n)
+        if n != self._buffer.size:
+            self._buffer.resize(max(n, 1))
 
-        Formula taken from the provided Wiimote-FFT-SVM.ipynb notebook.
-        """
-        n = len(input_values)
-        return np.abs(fft.fft(input_values) / n)[1:n // 2]
+        previous = window[..., :n - new_samples]
+        buffered = self._buffer.view()[..., len(self._buffer) - previous.shape[-1]:]
+        if len(self._buffer) < previous.shape[-1] or not np.array_equal(buffered, previous):
+            # samples were lost or the number of new samples is wrong: continue from the given window
+            self._buffer.clear()
+            self._buffer.extend(previous)
+            self._estimator.reset()
+
+        process_chunk(self._buffer, self._estimator, window[..., n - new_samples:])
+        return {'spectrumOut': self._estimator.spectrum}
+
+
+class MultiChannelFFTNode(SpectrumNode):
+    """
+    Fused buffer and FFT node for all three accelerometer axes.
+
+    Instead of one BufferNode and one FFTNode per axis, the last n samples of every axis are kept in a single
+    (3, n) ring buffer and the spectra of all axes are calculated with one batched real FFT. The stacked spectra
+    are provided as a (3, n/2 - 1) array, the single rows additionally on one output per axis (e.g. for plotting).
+
+    The inputs may be chunks of several new samples. The outputs above then hold the latest spectra only, while
+    framesOut holds all spectra due within the chunk (according to the hop size) as a (frames, 3, n/2 - 1) array.
+    """
+    nodeName = "MultiChannelFFTNode"
+
+    def __init__(self, name):
+        terminals = {
+            'accelX': dict(io='in'),
+            'accelY': dict(io='in'),
+            'accelZ': dict(io='in'),
+            'spectraOut': dict(io='out'),
+            'framesOut': dict(io='out'),
+            'spectrumX': dict(io='out'),
+            'spectrumY': dict(io='out'),
+            'spectrumZ': dict(io='out'),
+        }
+
+        self._buffer = RingBuffer(32, channels=3)
+        self._spectra = None
+        self._rows = None
+        SpectrumNode.__init__(self, name, terminals=terminals)
+
+    @property
+    def buffer_size(self):
+        return self._buffer.size
+
+    @buffer_size.setter
+    def buffer_size(self, size):
+        self._buffer.resize(size)
 
     def process(self, **kwds):
-        input_values = kwds["accelIn"]
-        frequency = self._calculate_fft(input_values)
-        return {'spectrumOut': frequency}
+        chunk = np.stack([np.ravel(kwds["accelX"]), np.ravel(kwds["accelY"]), np.ravel(kwds["accelZ"])])
+        frames = process_chunk(self._buffer, self._estimator, chunk)
+
+        spectra = self._estimator.spectrum
+        if spectra is None:
+            # nothing was received yet
+            spectra = np.zeros((3, 0))
+
+        if spectra is not self._spectra:
+            # keep the row views as long as the spectra did not change so the outputs stay the same objects
+            self._spectra = spectra
+            self._rows = tuple(spectra)
+        return {'spectraOut': spectra, 'framesOut': frames, 'spectrumX': self._rows[0],
+                'spectrumY': self._rows[1], 'spectrumZ': self._rows[2]}
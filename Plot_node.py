@@ -0,0 +1,69 @@
+from pyqtgraph.flowchart import Node
+from pyqtgraph.Qt import QtCore
+import numpy as np
+
+
+class RateLimitedPlotNode(Node):
+    """
+    Plots the data on its input into a PlotWidget like the PlotWidget node of the library, but decoupled from the
+    flowchart: process() only keeps a reference to the latest data, a timer redraws it at a fixed display rate if it
+    changed. The curve is reused and downsampled by pyqtgraph (peak method) if it has more points than pixels.
+    With a refresh rate of 0 the node does nothing, so plotting can be disabled without rewiring the chart.
+    """
+    nodeName = "RateLimitedPlot"
+
+    def __init__(self, name, refresh_rate=15):
+        terminals = {
+            'In': dict(io='in'),
+        }
+
+        self._plot = None
+        self._curve = None
+        self._data = None
+        self._changed = False
+        self._refresh_rate = 0
+
+        self.timer = QtCore.QTimer()
+        self.timer.timeout.connect(self.render)
+
+        Node.__init__(self, name, terminals=terminals)
+        self.set_refresh_rate(refresh_rate)
+
+    def setPlot(self, plot):
+        # same name as in the PlotWidget node of the library
+        self._plot = plot
+        self._curve = plot.plot()
+        self._curve.setDownsampling(auto=True, method='peak')
+        self._curve.setClipToView(True)
+
+    @property
+    def refresh_rate(self):
+        return self._refresh_rate
+
+    def set_refresh_rate(self, rate):
+        """
+        Sets the maximum number of redraws per second; 0 disables the plot.
+        """
+        self._refresh_rate = rate
+        if rate > 0:
+            self.timer.start(int(1000 / rate))
+        else:
+            self.timer.stop()
+            self._data = None
+            if self._curve is not None:
+                self._curve.clear()
+
+    def render(self):
+        if not self._changed or self._curve is None:
+            return
+        self._changed = False
+
+        if self._data is None:
+            self._curve.clear()
+        else:
+            self._curve.setData(np.asarray(self._data, dtype=float))
+
+    def process(self, **kwds):
+        if self._refresh_rate > 0:
+            self._data = kwds['In']
+            self._changed = True
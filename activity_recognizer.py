@@ -8,16 +8,19 @@ import pyqtgraph.flowchart.library as fclib
 from pyqtgraph.Qt import QtGui, QtCore
 import pyqtgraph as pg
 from DIPPID_pyqtnode import DIPPIDNode, BufferNode
-from FFT_node import FFTNode
+from FFT_node import FFTNode, MultiChannelFFTNode
 from Classifier_node import ClassifierNode
 from DisplayText_node import DisplayTextNode
+from Plot_node import RateLimitedPlotNode
 
 
 # noinspection PyAttributeOutsideInit
 class FlowChart:
-    def __init__(self, layout, port=5700):
+    def __init__(self, layout, port=5700, instrumentation=None, plot_rate=15):
         self.layout = layout
         self.port = port
+        self.instrumentation = instrumentation
+        self.plot_rate = plot_rate
 
         # Create an empty flowchart with a single input and output
         self.fc = Flowchart(terminals={})
@@ -31,6 +34,8 @@ class FlowChart:
         self.set_plot_widgets()
         self.create_nodes()
         self.connect_node_terminals()
+        if self.instrumentation is not None:
+            self.instrument_nodes()
 
     def create_plot_widgets(self):
         # create one plot widget for each axis below each other in the left column
@@ -50,27 +55,23 @@ class FlowChart:
         self.pw3.setTitle("Z-FFT")
 
     def set_plot_widgets(self):
-        self.pw1Node = self.fc.createNode('PlotWidget', pos=(300, -450))
+        # the plots are redrawn at most plot_rate times per second instead of on every evaluation (0: never)
+        self.pw1Node = self.fc.createNode('RateLimitedPlot', pos=(300, -450))
         self.pw1Node.setPlot(self.pw1)
-        self.pw2Node = self.fc.createNode('PlotWidget', pos=(300, -350))
+        self.pw2Node = self.fc.createNode('RateLimitedPlot', pos=(300, -350))
         self.pw2Node.setPlot(self.pw2)
-        self.pw3Node = self.fc.createNode('PlotWidget', pos=(300, -250))
+        self.pw3Node = self.fc.createNode('RateLimitedPlot', pos=(300, -250))
         self.pw3Node.setPlot(self.pw3)
+        for node in (self.pw1Node, self.pw2Node, self.pw3Node):
+            node.set_refresh_rate(self.plot_rate)
 
     def create_nodes(self):
         # create the dippid node and set the provided port automatically
         self.dippidNode = self.fc.createNode("DIPPID", pos=(-20, 0))
         self.dippidNode.set_connection_port(self.port)
 
-        # create buffer nodes for each axis
-        self.bufferNodeX = self.fc.createNode('Buffer', pos=(100, -150))
-        self.bufferNodeY = self.fc.createNode('Buffer', pos=(100, 0))
-        self.bufferNodeZ = self.fc.createNode('Buffer', pos=(100, 150))
-
-        # create fft nodes for each axis
-        self.fftNodeX = self.fc.createNode('FFTNode', pos=(250, -150))
-        self.fftNodeY = self.fc.createNode('FFTNode', pos=(250, 0))
-        self.fftNodeZ = self.fc.createNode('FFTNode', pos=(250, 150))
+        # create a single fused buffer and fft node for all three axes
+        self.fftNode = self.fc.createNode('MultiChannelFFTNode', pos=(150, 0))
 
         self.classifierNode = self.fc.createNode('ClassifierNode', pos=(350, 50))
         self.layout.addWidget(self.classifierNode.ctrlWidget(), 0, 1, 2, 2)
@@ -78,31 +79,86 @@ class FlowChart:
         self.layout.addWidget(self.displayTextNode.ctrlWidget(), 2, 1, 2, 2)
 
     def connect_node_terminals(self):
-        # connect the acceleration values with the buffer nodes and the buffers with the corresponding plot widgets
-        self.fc.connectTerminals(self.dippidNode['accelX'], self.bufferNodeX['dataIn'])
-        self.fc.connectTerminals(self.dippidNode['accelY'], self.bufferNodeY['dataIn'])
-        self.fc.connectTerminals(self.dippidNode['accelZ'], self.bufferNodeZ['dataIn'])
-        self.fc.connectTerminals(self.bufferNodeX['dataOut'], self.fftNodeX['accelIn'])
-        self.fc.connectTerminals(self.bufferNodeY['dataOut'], self.fftNodeY['accelIn'])
-        self.fc.connectTerminals(self.bufferNodeZ['dataOut'], self.fftNodeZ['accelIn'])
-
-        # for testing only: plot the output of the fft nodes
-        self.fc.connectTerminals(self.fftNodeX['spectrumOut'], self.pw1Node['In'])
-        self.fc.connectTerminals(self.fftNodeY['spectrumOut'], self.pw2Node['In'])
-        self.fc.connectTerminals(self.fftNodeZ['spectrumOut'], self.pw3Node['In'])
-
-        self.fc.connectTerminals(self.fftNodeX['spectrumOut'], self.classifierNode['valX'])
-        self.fc.connectTerminals(self.fftNodeY['spectrumOut'], self.classifierNode['valY'])
-        self.fc.connectTerminals(self.fftNodeZ['spectrumOut'], self.classifierNode['valZ'])
+        # connect the acceleration values with the fused buffer / fft node
+        self.fc.connectTerminals(self.dippidNode['accelX'], self.fftNode['accelX'])
+        self.fc.connectTerminals(self.dippidNode['accelY'], self.fftNode['accelY'])
+        self.fc.connectTerminals(self.dippidNode['accelZ'], self.fftNode['accelZ'])
+
+        # for testing only: plot the output of the fft node
+        self.fc.connectTerminals(self.fftNode['spectrumX'], self.pw1Node['In'])
+        self.fc.connectTerminals(self.fftNode['spectrumY'], self.pw2Node['In'])
+        self.fc.connectTerminals(self.fftNode['spectrumZ'], self.pw3Node['In'])
+
+        # the classifier gets the stacked spectra of all axes of all windows in a chunk at once
+        self.fc.connectTerminals(self.fftNode['framesOut'], self.classifierNode['frames'])
 
         # connect the result of the classifier node with the display node
         self.fc.connectTerminals(self.classifierNode['prediction'], self.displayTextNode['prediction'])
 
 
+    def instrument_nodes(self):
+        # time the process() calls of all nodes and measure the latency from the sensor to the displayed prediction
+        for node in self.fc.nodes().values():
+            self.instrumentation.instrument_node(node)
+        self.dippidNode.instrumentation = self.instrumentation
+        self.displayTextNode.instrumentation = self.instrumentation
+
+
 def register_custom_nodes():
     fclib.registerNodeType(FFTNode, [('Fft',)])
+    fclib.registerNodeType(MultiChannelFFTNode, [('Fft',)])
     fclib.registerNodeType(ClassifierNode, [('Classifier',)])
     fclib.registerNodeType(DisplayTextNode, [('Display',)])
+    fclib.registerNodeType(RateLimitedPlotNode, [('Display',)])
+
+
+def report_startup(flowchart):
+    """
+    Prints a line when the window is shown and when the classifier is ready and quits then (see startup_benchmark.py).
+    """
+    app = QtGui.QApplication.instance()
+    # the timer fires as soon as the event loop runs, i.e. right after the window was shown for the first time
+    QtCore.QTimer.singleShot(0, lambda: print("window_shown", flush=True))
+
+    def classifier_ready():
+        print("classifier_ready", flush=True)
+        app.quit()
+
+    if flowchart.classifierNode.is_training():
+        flowchart.classifierNode.training_done.connect(classifier_ready)
+    else:
+        QtCore.QTimer.singleShot(0, classifier_ready)
+
+
+def run_multi_device(args):
+    """
+    Classifies the data of several devices at once in worker processes and shows all predictions in one table.
+    """
+    from classifier_models import is_fitted
+    from multi_device import DeviceActivityWidget, MultiDeviceRecognizer, wait_for_classifier
+
+    app = QtGui.QApplication([])
+
+    # the classifier node loads the cached classifier (or trains one) which is then sent to all workers
+    classifier_node = ClassifierNode("classifier")
+    classifier = wait_for_classifier(classifier_node)
+    classifier_node.training_worker.shutdown()
+    if not is_fitted(classifier):
+        sys.exit("There is no trained classifier for the workers. Record some activities with a single device first!")
+
+    ports = [args.port] if args.by_address else range(args.port, args.port + args.devices)
+    recognizer = MultiDeviceRecognizer(ports, classifier, by_address=args.by_address, workers=args.workers)
+    recognizer.start()
+
+    win = QtGui.QMainWindow()
+    win.setWindowTitle('Assignment 8 - Activity Recognizer (multiple devices)')
+    win.setCentralWidget(DeviceActivityWidget(recognizer))
+    win.setGeometry(50, 50, 600, 400)
+    win.show()
+
+    exit_code = app.exec_()
+    recognizer.stop()
+    sys.exit(exit_code)
 
 
 def main():
@@ -110,7 +166,23 @@ def main():
     parser = ArgumentParser(description="A machine learning based activity recognizer based on the DIPPID protocol.")
     parser.add_argument("-p", "--port", help="The port on which the mobile device sends its data via DIPPID", type=int,
                         default=5700, required=False)
+    parser.add_argument("-n", "--devices", type=int, default=1, help="Number of devices; device i sends to port + i")
+    parser.add_argument("--by-address", action="store_true", help="Receive all devices on the one port and tell "
+                                                                  "them apart by their sender address")
+    parser.add_argument("--workers", type=int, default=None, help="Number of worker processes classifying the data "
+                                                                  "of multiple devices (default: number of cpus)")
+    parser.add_argument("--plot-rate", type=float, default=15, help="Maximum redraws per second of the spectrum "
+                                                                     "plots; 0 disables plotting")
+    parser.add_argument("--startup-benchmark", action="store_true", help="Report when the window was shown and the "
+                                                                         "classifier loaded, then quit")
+    parser.add_argument("--stats", action="store_true", help="Show a panel with live timing and latency statistics")
+    parser.add_argument("--stats-file", help="Write the timing and latency statistics to this file on exit "
+                                             "(.json, or .csv for a summary)")
     args = parser.parse_args()
+
+    if args.devices > 1 or args.by_address:
+        run_multi_device(args)
+        return
     port = args.port
 
     register_custom_nodes()
@@ -127,10 +199,23 @@ def main():
     # win.showMaximized()
     win.setGeometry(50, 50, 1500, 1200)
 
+    # the instrumentation is only active (and imported) if its statistics are shown or saved
+    instrumentation = None
+    if args.stats or args.stats_file:
+        from instrumentation import Instrumentation, StatsPanel
+        instrumentation = Instrumentation()
+
     # create the flowchart
-    flowchart = FlowChart(layout, port)
+    flowchart = FlowChart(layout, port, instrumentation, args.plot_rate)
+    if args.stats:
+        layout.addWidget(StatsPanel(instrumentation), 2, 0, 2, 1)
+    if args.stats_file:
+        app.aboutToQuit.connect(lambda: instrumentation.dump(args.stats_file))
 
     win.show()
+    if args.startup_benchmark:
+        report_startup(flowchart)
+
     # if not running in interactive mode or using PySide instead of PyQt, start the app
     if (sys.flags.interactive != 1) or not hasattr(QtCore, 'PYQT_VERSION'):
         sys.exit(QtGui.QApplication.instance().exec_())
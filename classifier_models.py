@@ -0,0 +1,161 @@
+"""
+The different classifiers the ClassifierNode can use.
+"""
+
+import json
+import os
+import pathlib
+import pickle
+import sys
+from enum import Enum
+import numpy as np
+
+# scikit-learn takes about a second to import, so it is imported only when a classifier is created (or unpickled)
+
+
+class ClassifierType(Enum):
+    SVM = "SVM (full refit)"
+    INCREMENTAL = "Incremental (SGD)"
+
+
+class Aggregation(Enum):
+    VOTE = "Majority vote"
+    MEAN_DECISION = "Mean decision function"
+
+
+def create_classifier(classifier_type, params=None, verbose=True):
+    """
+    Creates an unfitted classifier of the given type; params are passed to the constructor of the svm.SVC or the
+    IncrementalClassifier (see model_selection.py).
+    """
+    params = params or {}
+    if classifier_type == ClassifierType.SVM:
+        from sklearn import svm
+        from sklearn.pipeline import make_pipeline
+        from sklearn.preprocessing import StandardScaler
+
+        # the features have very different ranges, so they are standardized first
+        return make_pipeline(StandardScaler(), svm.SVC(verbose=verbose, **params))
+    elif classifier_type == ClassifierType.INCREMENTAL:
+        from incremental_classifier import IncrementalClassifier
+        return IncrementalClassifier(**params)
+    else:
+        raise ValueError(f"Classifier type {classifier_type} not known!")
+
+
+def is_fitted(classifier):
+    # also False for None, i.e. while no classifier was loaded yet
+    return hasattr(classifier, "classes_")
+
+
+def predict_recording(classifier, features, aggregation=Aggregation.VOTE):
+    """
+    Classifies all windows of a recording with a single vectorized call and aggregates the results into one label.
+    Returns the label and a confidence between 0 and 1:
+    - VOTE: the label predicted for most windows; the confidence is the share of windows with this label
+    - MEAN_DECISION: the label with the highest decision function averaged over all windows; the confidence is the
+      softmax of the averaged decision values
+    """
+    if len(features) == 0:
+        raise ValueError("There are no windows to classify!")
+
+    if aggregation == Aggregation.VOTE:
+        labels, counts = np.unique(classifier.predict(features), return_counts=True)
+        best = np.argmax(counts)
+        return labels[best], counts[best] / len(features)
+    elif aggregation == Aggregation.MEAN_DECISION:
+        scores = np.asarray(classifier.decision_function(features))
+        if scores.ndim == 1:
+            # binary classification: a single score per window, positive values mean the second class
+            scores = np.stack([-scores, scores], axis=1)
+        mean_scores = scores.mean(axis=0)
+        probabilities = np.exp(mean_scores - mean_scores.max())
+        probabilities /= probabilities.sum()
+        best = np.argmax(mean_scores)
+        return classifier.classes_[best], probabilities[best]
+    else:
+        raise ValueError(f"Aggregation {aggregation} not known!")
+
+
+# increase whenever the features or the classifiers change, so old cached classifiers are not used anymore
+MODEL_CACHE_VERSION = 3
+
+
+def _cache_file_path(folder, classifier_type):
+    return pathlib.Path(folder) / f"{classifier_type.name.lower()}.pkl"
+
+
+def save_cached_classifier(folder, classifier_type, classifier, data_hash):
+    """
+    Serializes the fitted classifier together with the hash of the recordings it was trained on.
+    """
+    file_path = _cache_file_path(folder, classifier_type)
+    file_path.parent.mkdir(parents=True, exist_ok=True)
+
+    tmp_path = file_path.with_suffix(".tmp")
+    with open(tmp_path, "wb") as cache_file:
+        pickle.dump({"version": MODEL_CACHE_VERSION, "data_hash": data_hash, "classifier": classifier}, cache_file)
+    os.replace(tmp_path, file_path)
+
+
+def load_cached_classifier(folder, classifier_type, data_hash):
+    """
+    Returns the cached classifier of the given type if it was trained on recordings with the given hash, else None.
+    """
+    file_path = _cache_file_path(folder, classifier_type)
+    if not file_path.exists():
+        return None
+
+    try:
+        with open(file_path, "rb") as cache_file:
+            cached = pickle.load(cache_file)
+    except (OSError, pickle.UnpicklingError, AttributeError, EOFError, ImportError) as e:
+        sys.stderr.write(f"Could not load the cached classifier {file_path}: {e}\n")
+        return None
+
+    if cached.get("version") != MODEL_CACHE_VERSION or cached.get("data_hash") != data_hash:
+        return None
+    return cached["classifier"]
+
+
+CLASSIFIER_CONFIG_VERSION = 1
+
+
+def save_classifier_config(path, classifier_type, params, **info):
+    """
+    Writes the classifier type to use and the parameters of every classifier type (a dict ClassifierType -> params)
+    to a json file; info is stored as well but not used when loading.
+    """
+    path = pathlib.Path(path)
+    config = {
+        "version": CLASSIFIER_CONFIG_VERSION,
+        "classifier_type": classifier_type.name,
+        "params": {params_type.name: type_params for params_type, type_params in params.items()},
+        **info,
+    }
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as config_file:
+        json.dump(config, config_file, indent=2)
+    os.replace(tmp_path, path)
+
+
+def load_classifier_config(path):
+    """
+    Returns the classifier type and the parameters per classifier type of the configuration file written by
+    save_classifier_config(), or (None, {}) if there is no valid one.
+    """
+    path = pathlib.Path(path)
+    if not path.is_file():
+        return None, {}
+
+    try:
+        with open(path, encoding="utf-8") as config_file:
+            config = json.load(config_file)
+        if config.get("version") != CLASSIFIER_CONFIG_VERSION:
+            return None, {}
+        params = {ClassifierType[name]: type_params for name, type_params in config["params"].items()}
+        return ClassifierType[config["classifier_type"]], params
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        sys.stderr.write(f"Could not load the classifier configuration {path}: {e}\n")
+        return None, {}
@@ -0,0 +1,151 @@
+"""
+NumPy-only inference for the trained svm classifiers.
+
+A fitted svm.SVC (optionally behind StandardScalers in a pipeline, like the classifier of ClassifierType.SVM) is
+compiled into a CompiledSVC which only keeps what the decision function needs: the standardization, the support
+vectors, one column of dual coefficients per pair of classes, the intercepts and the kernel. Predictions are a few
+matrix products without the input validation of scikit-learn and give the same labels and decision values. This
+module does not import scikit-learn, neither for compiling nor for predicting.
+"""
+
+import numpy as np
+
+
+class CompiledSVC:
+    """
+    The decision function of a fitted (standardized) svm.SVC with the one-vs-one scheme of libsvm.
+    Has the same predict() and decision_function() (also with decision_function_shape "ovr") as the pipeline it was
+    compiled from and can be used wherever a fitted classifier is expected for predictions.
+
+    coefficients: (support vectors, pairs) dual coefficients of the support vectors in the decision function of every
+    pair of classes (i, j), i < j, in the order of libsvm; a positive decision value is a vote for class i.
+    """
+
+    def __init__(self, classes, support_vectors, coefficients, intercepts, kernel="rbf", gamma=1.0, coef0=0.0,
+                 degree=3, mean=None, scale=None, decision_function_shape="ovr"):
+        self.classes_ = np.asarray(classes)
+        self.support_vectors = np.ascontiguousarray(support_vectors, dtype=float)
+        self.coefficients = np.ascontiguousarray(coefficients, dtype=float)
+        self.intercepts = np.asarray(intercepts, dtype=float)
+        self.kernel = kernel
+        self.gamma = float(gamma)
+        self.coef0 = float(coef0)
+        self.degree = int(degree)
+        self.mean = None if mean is None else np.asarray(mean, dtype=float)
+        self.scale = None if scale is None else np.asarray(scale, dtype=float)
+        self.decision_function_shape = decision_function_shape
+
+        if kernel not in ("rbf", "linear", "poly", "sigmoid"):
+            raise ValueError(f"Kernel {kernel} not supported!")
+
+        # +1 for the first and -1 for the second class of every pair (in the order of the columns of the coefficients),
+        # so the votes and summed confidences of all classes are a single matrix product each
+        n_classes = len(self.classes_)
+        pairs = [(i, j) for i in range(n_classes) for j in range(i + 1, n_classes)]
+        self._pair_classes = np.zeros((len(pairs), n_classes))
+        for pair, (i, j) in enumerate(pairs):
+            self._pair_classes[pair, i] = 1
+            self._pair_classes[pair, j] = -1
+        self._second_votes = np.sum(self._pair_classes == -1, axis=0)  # the votes if every pair chose its second class
+        self._sv_norms = np.einsum("ij,ij->i", self.support_vectors, self.support_vectors)
+
+    def _pairwise_decision(self, data):
+        data = np.asarray(data, dtype=float)
+        if data.ndim == 1:
+            data = data[np.newaxis]
+        if self.mean is not None:
+            data = data - self.mean
+        if self.scale is not None:
+            data = data / self.scale
+
+        products = data @ self.support_vectors.T
+        if self.kernel == "rbf":
+            squared_distances = np.sum(data * data, axis=1, keepdims=True) + self._sv_norms - 2 * products
+            kernel = np.exp(-self.gamma * np.maximum(squared_distances, 0))
+        elif self.kernel == "linear":
+            kernel = products
+        elif self.kernel == "poly":
+            kernel = (self.gamma * products + self.coef0) ** self.degree
+        else:
+            kernel = np.tanh(self.gamma * products + self.coef0)
+        return kernel @ self.coefficients + self.intercepts
+
+    def predict(self, data):
+        # every pair votes for one of its classes; on a tie the first class wins like in libsvm
+        decision = self._pairwise_decision(data)
+        votes = (decision > 0) @ self._pair_classes + self._second_votes
+        return self.classes_[np.argmax(votes, axis=1)]
+
+    def decision_function(self, data):
+        decision = self._pairwise_decision(data)
+        n_classes = len(self.classes_)
+        if n_classes == 2:
+            # like svm.SVC: a single score per sample, positive values mean the second class
+            return -decision[:, 0]
+        if self.decision_function_shape != "ovr":
+            return decision
+
+        # the transformation of the one-vs-one decision values of svm.SVC: the votes of every class plus its summed
+        # confidences scaled into (-1/3, 1/3), so they only break ties of the votes
+        votes = (decision >= 0) @ self._pair_classes + self._second_votes
+        confidences = decision @ self._pair_classes
+        return votes + confidences / (3 * (np.abs(confidences) + 1))
+
+    def save(self, path):
+        np.savez(path, classes=self.classes_, support_vectors=self.support_vectors, coefficients=self.coefficients,
+                 intercepts=self.intercepts, kernel=self.kernel, gamma=self.gamma, coef0=self.coef0,
+                 degree=self.degree, decision_function_shape=self.decision_function_shape,
+                 **({} if self.mean is None else {"mean": self.mean}),
+                 **({} if self.scale is None else {"scale": self.scale}))
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as saved:
+            return cls(saved["classes"], saved["support_vectors"], saved["coefficients"], saved["intercepts"],
+                       kernel=str(saved["kernel"]), gamma=float(saved["gamma"]), coef0=float(saved["coef0"]),
+                       degree=int(saved["degree"]), mean=saved["mean"] if "mean" in saved else None,
+                       scale=saved["scale"] if "scale" in saved else None,
+                       decision_function_shape=str(saved["decision_function_shape"]))
+
+
+def compile_classifier(classifier):
+    """
+    Returns a CompiledSVC with the same predictions as the fitted svm.SVC or pipeline of a StandardScaler and a
+    svm.SVC. Raises a ValueError for other classifiers, e.g. the IncrementalClassifier.
+    """
+    steps = [step for _, step in classifier.steps] if hasattr(classifier, "steps") else [classifier]
+    svc, scalers = steps[-1], steps[:-1]
+    # duck typing, so scikit-learn is not imported here: only svm.SVC (one-vs-one classification) has these attributes
+    if not (hasattr(svc, "support_vectors_") and hasattr(svc, "n_support_") and hasattr(svc, "classes_")):
+        raise ValueError(f"{type(svc).__name__} can not be compiled, only svm.SVC is supported!")
+    if len(scalers) > 1 or any(not hasattr(scaler, "with_mean") or not hasattr(scaler, "mean_") for scaler in scalers):
+        raise ValueError("Only a single StandardScaler is supported before the svm.SVC!")
+    if callable(svc.kernel) or svc.kernel == "precomputed":
+        raise ValueError(f"Kernel {svc.kernel} not supported!")
+
+    n_classes = len(svc.classes_)
+    dual_coef = np.asarray(svc.dual_coef_)
+    intercepts = np.asarray(svc.intercept_, dtype=float)
+    if n_classes == 2:
+        # svm.SVC flips the sign of the coefficients and intercept of a binary classifier compared to libsvm
+        dual_coef, intercepts = -dual_coef, -intercepts
+
+    # libsvm stores the coefficients of the support vectors of class i for the pair (i, j) in row j - 1 and the ones
+    # of class j in row i; collect them into one column per pair
+    starts = np.concatenate([[0], np.cumsum(svc.n_support_)])
+    coefficients = np.zeros((len(svc.support_vectors_), n_classes * (n_classes - 1) // 2))
+    pair = 0
+    for i in range(n_classes):
+        for j in range(i + 1, n_classes):
+            coefficients[starts[i]:starts[i + 1], pair] = dual_coef[j - 1, starts[i]:starts[i + 1]]
+            coefficients[starts[j]:starts[j + 1], pair] = dual_coef[i, starts[j]:starts[j + 1]]
+            pair += 1
+
+    mean = scale = None
+    if scalers:
+        mean = scalers[0].mean_ if scalers[0].with_mean else None
+        scale = scalers[0].scale_ if scalers[0].with_std else None
+    # the gamma used by the fitted classifier, i.e. also the value "scale" or "auto" resolved to
+    return CompiledSVC(svc.classes_, svc.support_vectors_, coefficients, intercepts, kernel=svc.kernel,
+                       gamma=svc._gamma, coef0=svc.coef0, degree=svc.degree, mean=mean, scale=scale,
+                       decision_function_shape=svc.decision_function_shape)
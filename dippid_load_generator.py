@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Local DIPPID traffic generator to stress the SensorUDP receiver without a phone.
+
+Sends accelerometer (and button) datagrams in the DIPPID json format to a UDP port at a fixed total rate, spread over
+several simulated devices (each with its own socket, i.e. sender address). The waveform is either synthetic or a
+recorded stream. With --measure a SensorUDP receiver is started in this process and the number of packets it actually
+processed is compared to the number of packets sent (--async-backend uses the asyncio receivers of DIPPID_async).
+"""
+
+import json
+import socket
+import time
+from argparse import ArgumentParser
+import numpy as np
+from sensor_streams import load_stream, synthetic_stream
+
+
+def create_waveform(waveform, n_samples, path=None, seed=0):
+    if waveform == "sine":
+        return synthetic_stream(n_samples, seed=seed)
+    elif waveform == "noise":
+        return np.random.default_rng(seed).normal(0, 1, size=(n_samples, 3))
+    elif waveform == "file":
+        return load_stream(path)
+    else:
+        raise ValueError(f"Waveform {waveform} not known!")
+
+
+def encode_packet(sample, button_pressed):
+    message = {"accelerometer": {"x": float(sample[0]), "y": float(sample[1]), "z": float(sample[2])},
+               "button_1": int(button_pressed)}
+    return json.dumps(message).encode()
+
+
+class LoadGenerator:
+    """
+    Sends `rate` packets per second in total to host:port, distributed round robin over `devices` sockets. If
+    port_per_device is set, device i sends to port + i instead.
+    """
+
+    def __init__(self, host, port, rate, devices=1, port_per_device=False, waveforms=None):
+        self.host = host
+        self.port = port
+        self.rate = rate
+        self.port_per_device = port_per_device
+        self.sockets = [socket.socket(socket.AF_INET, socket.SOCK_DGRAM) for _ in range(devices)]
+        self.waveforms = waveforms if waveforms is not None else [synthetic_stream(1000, seed=i)
+                                                                  for i in range(devices)]
+        self.sent = 0
+        self.send_errors = 0
+
+    def run(self, duration):
+        """
+        Sends packets for the given number of seconds; returns the achieved rate in packets per second.
+        """
+        interval = 1 / self.rate
+        start = time.perf_counter()
+        next_send = start
+        n_packets = int(duration * self.rate)
+
+        for i in range(n_packets):
+            device = i % len(self.sockets)
+            waveform = self.waveforms[device]
+            sample_index = i // len(self.sockets)
+            packet = encode_packet(waveform[sample_index % len(waveform)], (sample_index // 100) % 2)
+            port = self.port + device if self.port_per_device else self.port
+
+            try:
+                self.sockets[device].sendto(packet, (self.host, port))
+                self.sent += 1
+            except OSError:
+                self.send_errors += 1
+
+            # keep the rate: sleep if ahead of the schedule, send right away if behind
+            next_send += interval
+            delay = next_send - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+
+        elapsed = time.perf_counter() - start
+        return self.sent / elapsed if elapsed > 0 else 0.0
+
+    def close(self):
+        for sock in self.sockets:
+            sock.close()
+
+
+def start_receivers(port, devices, port_per_device, high_throughput=False, sensor_loop=None):
+    ports = [port + i for i in range(devices)] if port_per_device else [port]
+    if sensor_loop is not None:
+        return [sensor_loop.add_sensor(receiver_port) for receiver_port in ports]
+
+    from DIPPID import SensorUDP
+    return [SensorUDP(receiver_port, high_throughput=high_throughput) for receiver_port in ports]
+
+
+def stop_receivers(receivers, host, sensor_loop=None):
+    if sensor_loop is not None:
+        sensor_loop.stop()
+        return
+
+    for receiver in receivers:
+        receiver._receiving = False
+        # the receiving thread may be blocked in recvfrom(), so wake it up with an (invalid) packet to let it finish
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+            sock.sendto(b"", (host, receiver._port))
+        receiver.disconnect()
+
+
+def main():
+    parser = ArgumentParser(description="Sends simulated DIPPID accelerometer data via UDP.")
+    parser.add_argument("-p", "--port", type=int, default=5700, help="Port the packets are sent to")
+    parser.add_argument("--host", default="127.0.0.1", help="Host the packets are sent to")
+    parser.add_argument("-r", "--rate", type=float, default=100, help="Packets per second in total")
+    parser.add_argument("-n", "--devices", type=int, default=1, help="Number of simulated devices")
+    parser.add_argument("-d", "--duration", type=float, default=10, help="Duration in seconds")
+    parser.add_argument("--port-per-device", action="store_true", help="Device i sends to port + i")
+    parser.add_argument("--waveform", choices=["sine", "noise", "file"], default="sine")
+    parser.add_argument("--file", help="Recorded stream for --waveform file (.npy or .csv with x, y, z)")
+    parser.add_argument("--measure", action="store_true", help="Start a SensorUDP receiver in this process and "
+                                                               "report how many packets it processed")
+    parser.add_argument("--high-throughput", action="store_true", help="Use the batched receive mode of the "
+                                                                       "receiver started with --measure")
+    parser.add_argument("--async-backend", action="store_true", help="Use asyncio based receivers sharing one "
+                                                                     "event loop for --measure")
+    args = parser.parse_args()
+
+    waveforms = [create_waveform(args.waveform, 1000, args.file, seed=i) for i in range(args.devices)]
+    sensor_loop = None
+    if args.measure and args.async_backend:
+        from DIPPID_async import SensorLoop
+        sensor_loop = SensorLoop()
+    receivers = start_receivers(args.port, args.devices, args.port_per_device, args.high_throughput, sensor_loop) \
+        if args.measure else []
+
+    generator = LoadGenerator(args.host, args.port, args.rate, args.devices, args.port_per_device, waveforms)
+    achieved_rate = generator.run(args.duration)
+    generator.close()
+    print(f"Sent {generator.sent} packets ({achieved_rate:.0f}/s, {generator.send_errors} send errors) "
+          f"from {args.devices} device(s)")
+
+    if receivers:
+        time.sleep(0.5)  # give the receivers time to process the last packets
+        counters = [receiver.get_counters() for receiver in receivers]
+        received = sum(counter['received'] for counter in counters)
+        parsed = sum(counter['parsed'] for counter in counters)
+        coalesced = sum(counter['coalesced'] for counter in counters)
+        dropped = generator.sent - parsed
+        print(f"Received {received} packets, parsed {parsed} ({coalesced} coalesced), "
+              f"dropped {dropped} ({dropped / max(generator.sent, 1):.1%})")
+        stop_receivers(receivers, args.host, sensor_loop)
+
+
+if __name__ == '__main__':
+    main()
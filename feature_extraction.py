@@ -0,0 +1,49 @@
+"""
+Turns the amplitude spectra of the buffered accelerometer windows into one fixed-length feature vector per window.
+"""
+
+import numpy as np
+
+
+AXES = ("x", "y", "z")
+N_BANDS = 4  # number of equally wide frequency bands the spectrum is split into
+
+# the features calculated for every axis, in the order they appear in the feature vector
+AXIS_FEATURES = ("mean", "variance", "peak", "dominant_frequency", "spectral_centroid") + \
+    tuple(f"band_energy_{band}" for band in range(N_BANDS))
+FEATURE_NAMES = tuple(f"{axis}_{feature}" for axis in AXES for feature in AXIS_FEATURES)
+
+
+def extract_features(spectra):
+    """
+    Calculates the feature vectors for a (3, windows, bins) array of amplitude spectra (one spectrum per axis and
+    window) and returns them as a (windows, len(FEATURE_NAMES)) array.
+
+    Frequencies are given relative to the nyquist frequency, so windows of different lengths result in comparable
+    features. All features are calculated for all windows at once.
+    """
+    amplitudes = np.asarray(spectra, dtype=float)
+    n_windows, n_bins = amplitudes.shape[1], amplitudes.shape[2]
+    if n_windows == 0 or n_bins == 0:
+        return np.zeros((n_windows, len(FEATURE_NAMES)))
+
+    # the spectra start at the first bin above the constant part, so bin i corresponds to frequency i + 1
+    frequencies = np.arange(1, n_bins + 1) / (n_bins + 1)
+
+    total = amplitudes.sum(axis=-1)
+    centroid = (amplitudes * frequencies).sum(axis=-1) / np.where(total > 0, total, 1)
+
+    band_starts = np.linspace(0, n_bins, N_BANDS + 1).astype(int)[:-1]
+    band_widths = np.maximum(np.diff(np.append(band_starts, n_bins)), 1)
+    band_energies = np.add.reduceat(amplitudes ** 2, band_starts, axis=-1) / band_widths
+
+    features = np.concatenate([
+        amplitudes.mean(axis=-1)[..., np.newaxis],
+        amplitudes.var(axis=-1)[..., np.newaxis],
+        amplitudes.max(axis=-1)[..., np.newaxis],
+        frequencies[amplitudes.argmax(axis=-1)][..., np.newaxis],
+        centroid[..., np.newaxis],
+        band_energies,
+    ], axis=-1)  # shape (3, windows, features per axis)
+
+    return features.transpose(1, 0, 2).reshape(n_windows, -1)
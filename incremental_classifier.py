@@ -0,0 +1,79 @@
+"""
+The incremental classifier of ClassifierType.INCREMENTAL (in its own module, so scikit-learn is only imported when
+it is used).
+"""
+
+import numpy as np
+from sklearn.base import BaseEstimator, ClassifierMixin
+from sklearn.exceptions import NotFittedError
+from sklearn.kernel_approximation import RBFSampler
+from sklearn.linear_model import SGDClassifier
+from sklearn.preprocessing import StandardScaler
+
+
+class IncrementalClassifier(ClassifierMixin, BaseEstimator):
+    """
+    A linear svm trained with stochastic gradient descent on random fourier features which approximate the rbf kernel
+    of svm.SVC. Instead of refitting on all recordings, new recordings can be learned with partial_fit() in time
+    proportional to the size of the new recording only.
+    The classes have to be known at the first call of partial_fit(); an unknown class requires a new fit().
+    """
+
+    def __init__(self, n_components=200, epochs=5, alpha=1e-4, gamma=None, random_state=0):
+        self.n_components = n_components
+        self.epochs = epochs  # passes over the data on a full fit, partial_fit() always does a single pass
+        self.alpha = alpha  # regularization of the linear svm
+        self.gamma = gamma  # kernel width; None is the same as the default ("scale") of svm.SVC
+        self.random_state = random_state
+        self.__reset()
+
+    def __reset(self):
+        self._scaler = StandardScaler()
+        self._feature_map = None  # created on the first fit as the kernel width depends on the data
+        self._classifier = SGDClassifier(loss="hinge", alpha=self.alpha, random_state=self.random_state)
+
+    @property
+    def classes_(self):
+        if not hasattr(self._classifier, "classes_"):
+            raise AttributeError("The classifier has not been fitted yet.")
+        return self._classifier.classes_
+
+    def fit(self, training_data, training_labels):
+        self.__reset()
+        training_data = np.asarray(training_data, dtype=float)
+        self.__fit_transform(training_data)
+        classes = np.unique(training_labels)
+        for _ in range(self.epochs):
+            self._classifier.partial_fit(self.__transform(training_data), training_labels, classes=classes)
+        return self
+
+    def partial_fit(self, training_data, training_labels, classes=None):
+        """
+        Trains the linear svm with one pass over the given data. The standardization and the feature map are fixed
+        by the first fit, so the features of the data learnt before keep their meaning. To not forget the other
+        classes, the data should contain windows of all classes (see BalancedTrainingSet.sample()).
+        """
+        training_data = np.asarray(training_data, dtype=float)
+        if self._feature_map is None:
+            self.__fit_transform(training_data)
+
+        self._classifier.partial_fit(self.__transform(training_data), training_labels, classes=classes)
+        return self
+
+    def __fit_transform(self, training_data):
+        self._scaler.fit(training_data)
+        # the default kernel width is the one of svm.SVC ("scale"); the data is standardized so its variance is 1
+        gamma = 1.0 / training_data.shape[1] if self.gamma is None else self.gamma
+        self._feature_map = RBFSampler(gamma=gamma, n_components=self.n_components, random_state=self.random_state)
+        self._feature_map.fit(training_data)
+
+    def decision_function(self, data):
+        return self._classifier.decision_function(self.__transform(data))
+
+    def predict(self, data):
+        return self._classifier.predict(self.__transform(data))
+
+    def __transform(self, data):
+        if self._feature_map is None:
+            raise NotFittedError("The classifier was used before being trained with data!")
+        return self._feature_map.transform(self._scaler.transform(np.asarray(data, dtype=float)))
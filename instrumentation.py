@@ -0,0 +1,182 @@
+"""
+Timing and latency instrumentation of the activity recognizer.
+
+Measures the duration of every process() call of the flowchart nodes, the number of samples waiting in the sensor
+queue on every update and the latency from the arrival of a packet (in the receiving thread of the sensor) to the
+prediction being displayed. All values are collected in histograms with fixed buckets, so the memory used does not
+grow with the running time. The statistics can be shown live in a StatsPanel and written to a json or csv file.
+"""
+
+import csv
+import json
+import pathlib
+import time
+from bisect import bisect_right
+from pyqtgraph.Qt import QtGui, QtCore
+import numpy as np
+
+
+DURATION_BUCKETS = tuple(np.logspace(-6, 1, 29))  # 1 us to 10 s, four buckets per decade
+DEPTH_BUCKETS = tuple(2.0 ** np.arange(17))  # 1 to 65536 samples
+
+
+class Histogram:
+    """
+    Counts values in buckets given by their upper edges; values above the last edge are counted in an extra bucket.
+    Percentiles are estimated as the upper edge of the bucket they fall into (at most the maximum).
+    """
+
+    def __init__(self, edges):
+        self.edges = edges
+        self.counts = [0] * (len(edges) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, value):
+        self.counts[bisect_right(self.edges, value)] += 1
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+    def percentile(self, q):
+        if not self.count:
+            return 0.0
+        index = int(np.searchsorted(np.cumsum(self.counts), q / 100 * self.count))
+        return min(self.edges[index], self.max) if index < len(self.edges) else self.max
+
+    def to_dict(self):
+        return {"count": self.count, "mean": self.mean, "p50": self.percentile(50), "p95": self.percentile(95),
+                "max": self.max, "edges": list(self.edges), "counts": list(self.counts)}
+
+
+class Instrumentation:
+    """
+    Collects the statistics of the instrumented nodes (see instrument_node()), the queue depths and the
+    packet-to-prediction latencies.
+    """
+
+    def __init__(self):
+        self.durations = {}  # node name -> Histogram of the process() durations
+        self.queue_depths = {}  # queue name -> Histogram of the number of waiting samples
+        self.latencies = {"packet_to_prediction_newest": Histogram(DURATION_BUCKETS),
+                          "packet_to_prediction_oldest": Histogram(DURATION_BUCKETS)}
+        self._arrival = None  # arrival times of the oldest and newest sample currently passing the flowchart
+        self._start = time.perf_counter()
+
+    def instrument_node(self, node):
+        """
+        Replaces the process() method of the given flowchart node by one that measures its duration.
+        """
+        process = node.process
+        name = node.name()
+
+        def timed_process(**kwds):
+            start = time.perf_counter()
+            try:
+                return process(**kwds)
+            finally:
+                self.record_duration(name, time.perf_counter() - start)
+
+        node.process = timed_process
+
+    def record_duration(self, name, duration):
+        if name not in self.durations:
+            self.durations[name] = Histogram(DURATION_BUCKETS)
+        self.durations[name].add(duration)
+
+    def record_queue_depth(self, name, depth):
+        if name not in self.queue_depths:
+            self.queue_depths[name] = Histogram(DEPTH_BUCKETS)
+        self.queue_depths[name].add(depth)
+
+    def mark_arrival(self, oldest, newest):
+        """
+        Sets the arrival times (from time.perf_counter()) of the oldest and newest sample of the chunk that is about
+        to pass the flowchart.
+        """
+        self._arrival = (oldest, newest)
+
+    def record_prediction(self):
+        """
+        Records the latency from the arrival of the marked samples until now, i.e. the prediction being shown.
+        """
+        if self._arrival is None:
+            return
+        now = time.perf_counter()
+        oldest, newest = self._arrival
+        self.latencies["packet_to_prediction_oldest"].add(now - oldest)
+        self.latencies["packet_to_prediction_newest"].add(now - newest)
+        self._arrival = None
+
+    def snapshot(self):
+        return {
+            "uptime": time.perf_counter() - self._start,
+            "nodes": {name: histogram.to_dict() for name, histogram in self.durations.items()},
+            "queue_depths": {name: histogram.to_dict() for name, histogram in self.queue_depths.items()},
+            "latencies": {name: histogram.to_dict() for name, histogram in self.latencies.items()},
+        }
+
+    def rows(self):
+        """
+        Returns one (kind, name, histogram) row per recorded statistic.
+        """
+        return [("node", name, histogram) for name, histogram in self.durations.items()] + \
+            [("queue_depth", name, histogram) for name, histogram in self.queue_depths.items()] + \
+            [("latency", name, histogram) for name, histogram in self.latencies.items()]
+
+    def dump(self, path):
+        """
+        Writes the statistics to a json file (with the histograms) or, if the path ends with .csv, a csv file with
+        one summary row per statistic.
+        """
+        path = pathlib.Path(path)
+        if path.suffix.lower() == ".csv":
+            with open(path, "w", newline="", encoding="utf-8") as csv_file:
+                writer = csv.writer(csv_file)
+                writer.writerow(["kind", "name", "count", "mean", "p50", "p95", "max"])
+                for kind, name, histogram in self.rows():
+                    writer.writerow([kind, name, histogram.count, histogram.mean, histogram.percentile(50),
+                                     histogram.percentile(95), histogram.max])
+        else:
+            with open(path, "w", encoding="utf-8") as json_file:
+                json.dump(self.snapshot(), json_file, indent=2)
+
+
+class StatsPanel(QtGui.QWidget):
+    """
+    Small table with the live statistics of an Instrumentation, refreshed periodically.
+    """
+
+    def __init__(self, instrumentation, refresh_interval=500):
+        super().__init__()
+        self.instrumentation = instrumentation
+        self._init_ui()
+
+        self.timer = QtCore.QTimer()
+        self.timer.timeout.connect(self.refresh)
+        self.timer.start(refresh_interval)
+
+    def _init_ui(self):
+        self.layout = QtGui.QVBoxLayout()
+
+        self.table = QtGui.QTableWidget(0, 5)
+        self.table.setHorizontalHeaderLabels(["Statistic", "Count", "Mean", "p95", "Max"])
+        self.table.horizontalHeader().setStretchLastSection(True)
+        self.layout.addWidget(self.table)
+        self.setLayout(self.layout)
+
+    def refresh(self):
+        rows = self.instrumentation.rows()
+        self.table.setRowCount(len(rows))
+        for row, (kind, name, histogram) in enumerate(rows):
+            # durations and latencies are shown in ms, queue depths in samples
+            unit, scale = ("", 1) if kind == "queue_depth" else (" ms", 1000)
+            values = [f"{kind}: {name}", str(histogram.count), f"{histogram.mean * scale:.2f}{unit}",
+                      f"{histogram.percentile(95) * scale:.2f}{unit}", f"{histogram.max * scale:.2f}{unit}"]
+            for column, value in enumerate(values):
+                self.table.setItem(row, column, QtGui.QTableWidgetItem(value))
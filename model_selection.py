@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Offline model selection for the classifiers of the ClassifierNode.
+
+Grid or random search over the parameters of every classifier type (see SEARCH_SPACES). Every candidate is
+cross-validated (stratified k-fold) on the same class-balanced training set the ClassifierNode trains on; the fits of
+all candidates and folds are distributed over a pool of worker processes, so all cores are used.
+Neighbouring windows of a recording overlap in all but one sample, so the folds consist of contiguous blocks of
+windows and the training windows next to a test block are left out (see blocked_folds()); with randomly split
+windows nearly the same windows would be in the training and the test part and the scores would be inflated.
+
+The results are cached per dataset (the hash of the recordings and the cap of the training set), so running the
+search again only evaluates candidates that were not evaluated on this data yet. The best classifier type and the
+best parameters of every type are written to the configuration file the ClassifierNode loads at startup.
+"""
+
+import json
+import multiprocessing
+import os
+import pathlib
+import time
+from argparse import ArgumentParser
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+from classifier_models import ClassifierType, create_classifier, load_classifier_config, save_classifier_config
+from recording_store import open_store
+from training_set import DEFAULT_CAP, BalancedTrainingSet
+
+
+# the same folders as the ClassifierNode uses
+STORE_FOLDER = pathlib.Path("recorded_actions/store")
+RESULTS_FOLDER = pathlib.Path("recorded_actions/model_cache/model_selection")
+CONFIG_PATH = pathlib.Path("recorded_actions/classifier_config.json")
+
+# the values tried for every parameter; grid search tries all combinations, random search a sample of them
+SEARCH_SPACES = {
+    ClassifierType.SVM: {
+        "C": [0.1, 0.3, 1.0, 3.0, 10.0, 30.0, 100.0],
+        "gamma": ["scale", 0.003, 0.01, 0.03, 0.1, 0.3],
+    },
+    ClassifierType.INCREMENTAL: {
+        "alpha": [1e-5, 3e-5, 1e-4, 3e-4, 1e-3],
+        "n_components": [100, 200, 400],
+        "gamma": [None, 0.01, 0.03, 0.1],
+    },
+}
+
+
+def candidates(classifier_types, search="grid", iterations=20, seed=0):
+    """
+    Returns the (classifier type, parameters) pairs to evaluate; with random search at most `iterations` per type.
+    """
+    from sklearn.model_selection import ParameterGrid, ParameterSampler
+
+    result = []
+    for classifier_type in classifier_types:
+        space = SEARCH_SPACES[classifier_type]
+        grid = ParameterGrid(space)
+        if search == "random" and iterations < len(grid):
+            params = ParameterSampler(space, iterations, random_state=seed)
+        else:
+            params = grid
+        result += [(classifier_type, dict(candidate_params)) for candidate_params in params]
+    return result
+
+
+def candidate_key(classifier_type, params, folds, seed):
+    return json.dumps([classifier_type.name, params, folds, seed], sort_keys=True)
+
+
+_worker_data = None  # (features, labels, folds) of a worker process, see _init_worker()
+
+
+def _init_worker(features, labels, folds):
+    # runs once in every worker process, so the data is not sent again with every fit
+    global _worker_data
+    _worker_data = (features, labels, folds)
+
+
+def _evaluate(classifier_type, params, fold):
+    # runs in a worker process: fits on the training part of the fold and returns the accuracy on the rest
+    features, labels, folds = _worker_data
+    train, test = folds[fold]
+    start = time.perf_counter()
+    classifier = create_classifier(classifier_type, params, verbose=False)
+    classifier.fit(features[train], labels[train])
+    return float(classifier.score(features[test], labels[test])), time.perf_counter() - start
+
+
+def blocked_folds(labels, origins, folds=5, block=50, gap=32, seed=0):
+    """
+    Returns the (train, test) indices of stratified folds of blocks of `block` consecutive windows of a recording;
+    origins are the indices of the recording and the window of every sample (see BalancedTrainingSet.get_origins()).
+    Training windows less than `gap` windows away from a test window of the same recording are left out, as they
+    still overlap with it.
+    """
+    from sklearn.model_selection import StratifiedGroupKFold
+
+    labels = np.asarray(labels)
+    recording_keys = [f"{label}/{recording}" for label, (recording, _) in zip(labels, origins)]
+    _, recordings = np.unique(recording_keys, return_inverse=True)
+    _, groups = np.unique([f"{key}/{window // block}" for key, (_, window) in zip(recording_keys, origins)],
+                          return_inverse=True)
+    windows = origins[:, 1]
+
+    splits = []
+    for train, test in StratifiedGroupKFold(folds, shuffle=True, random_state=seed).split(labels, labels, groups):
+        keep = np.ones(len(train), dtype=bool)
+        for recording in np.unique(recordings[test]):
+            test_windows = np.sort(windows[test][recordings[test] == recording])
+            in_recording = recordings[train] == recording
+            train_windows = windows[train][in_recording]
+            # the distance of every training window of this recording to the closest test window before and after it
+            after = np.clip(np.searchsorted(test_windows, train_windows), 1, len(test_windows))
+            closest = np.minimum(np.abs(train_windows - test_windows[after - 1]),
+                                 np.abs(train_windows - test_windows[np.minimum(after, len(test_windows) - 1)]))
+            keep[np.flatnonzero(in_recording)[closest < gap]] = False
+        splits.append((train[keep], test))
+    return splits
+
+
+def cross_validate(features, labels, origins, candidate_list, folds=5, jobs=None, seed=0, results=None,
+                   on_result=None, block=50, gap=32):
+    """
+    Cross-validates the candidates in `jobs` worker processes and returns the results of all of them by
+    candidate_key(). Candidates already in results are not evaluated again; on_result(key, result) is called
+    whenever a candidate is finished.
+    """
+    results = dict(results or {})
+    pending = [(classifier_type, params) for classifier_type, params in candidate_list
+               if candidate_key(classifier_type, params, folds, seed) not in results]
+    if not pending:
+        return results
+
+    splits = blocked_folds(labels, origins, folds, block, gap, seed)
+    scores = {}  # key -> list of (score, duration) of the finished folds
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(jobs or os.cpu_count(), mp_context=context, initializer=_init_worker,
+                             initargs=(features, labels, splits)) as executor:
+        # one task per fold instead of per candidate, so the work is spread evenly over the processes
+        futures = {executor.submit(_evaluate, classifier_type, params, fold): (classifier_type, params)
+                   for classifier_type, params in pending for fold in range(folds)}
+        for future in as_completed(futures):
+            classifier_type, params = futures[future]
+            key = candidate_key(classifier_type, params, folds, seed)
+            scores.setdefault(key, []).append(future.result())
+            if len(scores[key]) < folds:
+                continue
+
+            fold_scores = [score for score, _ in scores[key]]
+            results[key] = {"classifier_type": classifier_type.name, "params": params, "folds": folds, "seed": seed,
+                            "mean": float(np.mean(fold_scores)), "std": float(np.std(fold_scores)),
+                            "fit_time": float(np.mean([duration for _, duration in scores[key]]))}
+            if on_result is not None:
+                on_result(key, results[key])
+    return results
+
+
+def load_results(path):
+    if not path.is_file():
+        return {}
+    with open(path, encoding="utf-8") as results_file:
+        return json.load(results_file)
+
+
+def save_results(path, results):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as results_file:
+        json.dump(results, results_file, indent=2)
+    os.replace(tmp_path, path)
+
+
+def best_results(results):
+    """
+    Returns the best result per classifier type (highest mean accuracy, the lower standard deviation on a tie).
+    """
+    best = {}
+    for result in results:
+        classifier_type = ClassifierType[result["classifier_type"]]
+        if classifier_type not in best or (result["mean"], -result["std"]) > (best[classifier_type]["mean"],
+                                                                             -best[classifier_type]["std"]):
+            best[classifier_type] = result
+    return best
+
+
+def main():
+    parser = ArgumentParser(description="Searches the best parameters of the classifiers by cross-validation on the "
+                                        "recording store and writes them to the configuration loaded by the "
+                                        "activity recognizer.")
+    parser.add_argument("--search", choices=("grid", "random"), default="grid", help="Grid or random search")
+    parser.add_argument("--iterations", type=int, default=20, help="Candidates per classifier type of the random "
+                                                                   "search")
+    parser.add_argument("--types", nargs="+", choices=[classifier_type.name for classifier_type in ClassifierType],
+                        default=[classifier_type.name for classifier_type in ClassifierType],
+                        help="Classifier types to search")
+    parser.add_argument("--folds", type=int, default=5, help="Folds of the cross-validation")
+    parser.add_argument("--block", type=int, default=50, help="Consecutive windows of a recording which are kept in "
+                                                              "the same fold")
+    parser.add_argument("--gap", type=int, default=32, help="Training windows this close to a test window of the "
+                                                            "same recording are left out (the buffer size, as "
+                                                            "windows this close overlap)")
+    parser.add_argument("--jobs", type=int, default=None, help="Worker processes (default: number of cores)")
+    parser.add_argument("--cap", type=int, default=DEFAULT_CAP, help="Max. windows per activity, like in the "
+                                                                      "ClassifierNode")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the folds and the random search")
+    parser.add_argument("--store", type=pathlib.Path, default=STORE_FOLDER, help="Folder of the recording store")
+    parser.add_argument("--config", type=pathlib.Path, default=CONFIG_PATH, help="Configuration file to write")
+    args = parser.parse_args()
+
+    store = open_store(args.store)
+    if store.is_empty():
+        parser.error(f"There are no recordings in {args.store}!")
+
+    print("Loading the recorded activities...")
+    training_set = BalancedTrainingSet(args.cap)
+    training_set.update(store)
+    features, labels = training_set.get_data()
+    labels = np.asarray(labels)
+    origins = training_set.get_origins()
+    data_hash = f"{store.content_hash()}-{args.cap}"
+
+    results_path = RESULTS_FOLDER / f"{data_hash}-{args.block}-{args.gap}.json"
+    results = load_results(results_path)
+    candidate_list = candidates([ClassifierType[name] for name in args.types], args.search, args.iterations,
+                                args.seed)
+    keys = [candidate_key(classifier_type, params, args.folds, args.seed) for classifier_type, params in candidate_list]
+    print(f"{len(candidate_list)} candidates on {len(features)} windows, {sum(key in results for key in keys)} of them "
+          f"cached")
+
+    def on_result(key, result):
+        # save after every candidate, so an interrupted search does not have to start from scratch
+        results[key] = result
+        save_results(results_path, results)
+        print(f"  {result['classifier_type']:<12} {json.dumps(result['params'], sort_keys=True):<50} "
+              f"{result['mean']:.4f} +- {result['std']:.4f}")
+
+    start = time.perf_counter()
+    results = cross_validate(features, labels, origins, candidate_list, args.folds, args.jobs, args.seed, results,
+                             on_result, args.block, args.gap)
+    print(f"Finished in {time.perf_counter() - start:.1f} s")
+
+    best = best_results([results[key] for key in keys])
+    for classifier_type, result in best.items():
+        print(f"Best {classifier_type.name}: {result['params']} ({result['mean']:.4f} +- {result['std']:.4f})")
+    best_type = max(best, key=lambda classifier_type: best[classifier_type]["mean"])
+
+    # the parameters of classifier types which were not searched this time are kept
+    _, params = load_classifier_config(args.config)
+    params.update({classifier_type: result["params"] for classifier_type, result in best.items()})
+    save_classifier_config(args.config, best_type, params, data_hash=data_hash,
+                           scores={classifier_type.name: result["mean"] for classifier_type, result in best.items()})
+    print(f"Wrote the configuration ({best_type.name}) to {args.config}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,260 @@
+"""
+Activity recognition for many DIPPID devices at once.
+
+The packets of all devices are received in one asyncio event loop, either on a range of ports (one port per device)
+or on a single port where the devices are told apart by their sender address. The accelerometer samples of every
+device are collected and sent in chunks to a pool of worker processes. Every device is assigned to one worker which
+runs the same buffer -> fft -> classifier pipeline as the flowchart for it; the (already trained) classifier is sent
+to every worker once when it is started. The smoothed predictions of all devices are collected in the main process
+and shown in a single DeviceActivityWidget.
+"""
+
+import asyncio
+import multiprocessing
+import os
+import queue
+import sys
+from threading import Lock, Thread
+from pyqtgraph.Qt import QtGui, QtCore
+import numpy as np
+from DIPPID import fast_json
+from DIPPID_async import SensorLoop
+from FFT_node import SpectrumEstimator, process_chunk
+from ring_buffer import RingBuffer
+from streaming_prediction import StreamingPredictor
+
+
+class DevicePipeline:
+    """
+    Buffer, spectra and streaming prediction of a single device (the MultiChannelFFTNode and the continuous
+    prediction of the ClassifierNode without the ui).
+    """
+
+    def __init__(self, buffer_size=32, hop_size=1, window_count=5, min_votes=3):
+        self._buffer = RingBuffer(buffer_size, channels=3)
+        self._estimator = SpectrumEstimator(hop_size=hop_size)
+        self._predictor = StreamingPredictor(window_count=window_count, min_votes=min_votes)
+        self.label = None
+        self.samples = 0
+
+    def process(self, chunk, classifier):
+        """
+        Processes a (n, 3) chunk of accelerometer values and returns the current label.
+        """
+        frames = process_chunk(self._buffer, self._estimator, np.asarray(chunk).T)
+        if len(frames):
+            self.label = self._predictor.update_chunk(classifier, frames)
+        self.samples += len(chunk)
+        return self.label
+
+
+def _run_worker(classifier, settings, inbox, outbox):
+    # runs in a worker process: processes the chunks of the devices assigned to it until it gets None
+    pipelines = {}
+    while True:
+        item = inbox.get()
+        if item is None:
+            return
+
+        device, chunk = item
+        if device not in pipelines:
+            pipelines[device] = DevicePipeline(**settings)
+        pipeline = pipelines[device]
+        label = pipeline.process(chunk, classifier)
+        outbox.put((device, label, pipeline.samples))
+
+
+class _DeviceProtocol(asyncio.DatagramProtocol):
+    def __init__(self, receiver, port, by_address):
+        self._receiver = receiver
+        self._port = port
+        self._by_address = by_address
+
+    def datagram_received(self, data, addr):
+        device = f"{addr[0]}:{addr[1]}" if self._by_address else self._port
+        self._receiver._datagram_received(device, data)
+
+
+class MultiDeviceRecognizer:
+    """
+    Receives the data of many devices and classifies it in `workers` processes.
+
+    ports: the ports to listen on; with by_address every sender address is a device of its own, otherwise every port.
+    classifier: the fitted classifier used by all workers (e.g. a CompiledSVC).
+    flush_interval: the collected samples are sent to the workers in chunks every flush_interval seconds.
+    queue_size: chunks waiting for a worker at most; further chunks are dropped until the worker caught up. The
+    chunks of workers which died are dropped as well.
+    """
+
+    def __init__(self, ports, classifier, by_address=False, workers=None, flush_interval=0.02, queue_size=100,
+                 **pipeline_settings):
+        self._ports = list(ports)
+        self._by_address = by_address
+        self._flush_interval = flush_interval
+
+        self._lock = Lock()
+        self._pending = {}  # device -> samples not sent to its worker yet
+        self._assignments = {}  # device -> index of its worker
+        self._predictions = {}  # device -> (label, processed samples)
+        self._received = 0
+        self._dropped = 0
+        self._dropped_chunks = 0
+        self._dead_workers = set()
+        self._running = False
+
+        context = multiprocessing.get_context("spawn")
+        self._outbox = context.Queue()
+        self._inboxes = [context.Queue(maxsize=queue_size) for _ in range(workers or os.cpu_count() or 1)]
+        self._workers = [context.Process(target=_run_worker, args=(classifier, pipeline_settings, inbox, self._outbox),
+                                         daemon=True) for inbox in self._inboxes]
+
+        self._sensor_loop = None
+        self._transports = []
+        self._result_thread = Thread(target=self.__collect_results, name="multi-device-results", daemon=True)
+
+    def start(self):
+        for worker in self._workers:
+            worker.start()
+        self._result_thread.start()
+
+        self._running = True
+        self._sensor_loop = SensorLoop()
+        for port in self._ports:
+            transport, _ = self._sensor_loop.run(self._sensor_loop.loop.create_datagram_endpoint(
+                lambda port=port: _DeviceProtocol(self, port, self._by_address), local_addr=('0.0.0.0', port))).result()
+            self._transports.append(transport)
+        self._sensor_loop.run(self.__flush_periodically())
+
+    def stop(self):
+        self._running = False
+        if self._sensor_loop is not None:
+            for transport in self._transports:
+                self._sensor_loop.loop.call_soon_threadsafe(transport.close)
+            self._sensor_loop.stop()
+            self._transports.clear()
+
+        for worker, inbox in zip(self._workers, self._inboxes):
+            if worker.is_alive():
+                try:
+                    inbox.put(None, timeout=1)
+                except queue.Full:
+                    worker.terminate()
+        for worker in self._workers:
+            worker.join()
+        self._outbox.put(None)
+        self._result_thread.join()
+
+    def _datagram_received(self, device, data):
+        # called in the event loop: only decode the sample, the processing happens in the workers
+        self._received += 1
+        try:
+            accelerometer = fast_json.loads(data)['accelerometer']
+            sample = (float(accelerometer['x']), float(accelerometer['y']), float(accelerometer['z']))
+        except (ValueError, KeyError, TypeError):
+            # incomplete data or a packet without accelerometer values
+            self._dropped += 1
+            return
+        self._pending.setdefault(device, []).append(sample)
+
+    async def __flush_periodically(self):
+        while self._running:
+            await asyncio.sleep(self._flush_interval)
+            self.__flush()
+
+    def __flush(self):
+        pending, self._pending = self._pending, {}
+        for device, samples in pending.items():
+            if device not in self._assignments:
+                # distribute the devices round robin over the workers in the order they appear
+                self._assignments[device] = len(self._assignments) % len(self._inboxes)
+            index = self._assignments[device]
+            if not self.__is_alive(index):
+                self._dropped_chunks += 1
+                continue
+            try:
+                self._inboxes[index].put_nowait((device, np.array(samples)))
+            except queue.Full:
+                # the worker can't keep up; dropping keeps the memory bounded and the predictions current
+                self._dropped_chunks += 1
+
+    def __is_alive(self, index):
+        if index in self._dead_workers:
+            return False
+        if self._workers[index].exitcode is None:
+            return True
+        self._dead_workers.add(index)
+        sys.stderr.write(f"Worker {index} stopped with exit code {self._workers[index].exitcode}, the data of its "
+                         f"devices is dropped\n")
+        return False
+
+    def __collect_results(self):
+        while True:
+            result = self._outbox.get()
+            if result is None:
+                return
+            device, label, samples = result
+            with self._lock:
+                self._predictions[device] = (label, samples)
+
+    def get_predictions(self):
+        """
+        Returns the current label and the number of processed samples of every device.
+        """
+        with self._lock:
+            return dict(self._predictions)
+
+    def get_counters(self):
+        return {'received': self._received, 'dropped': self._dropped, 'devices': len(self._assignments),
+                'dropped_chunks': self._dropped_chunks, 'dead_workers': len(self._dead_workers)}
+
+
+class DeviceActivityWidget(QtGui.QWidget):
+    """
+    Table of the predicted activity of every device, refreshed from a MultiDeviceRecognizer.
+    """
+
+    def __init__(self, recognizer, refresh_interval=200):
+        super().__init__()
+        self.recognizer = recognizer
+        self._init_ui()
+
+        self.timer = QtCore.QTimer()
+        self.timer.timeout.connect(self.refresh)
+        self.timer.start(refresh_interval)
+
+    def _init_ui(self):
+        self.layout = QtGui.QVBoxLayout()
+
+        self.table = QtGui.QTableWidget(0, 3)
+        self.table.setHorizontalHeaderLabels(["Device", "Predicted activity", "Samples"])
+        self.table.horizontalHeader().setStretchLastSection(True)
+        self.layout.addWidget(self.table)
+
+        self.status_label = QtGui.QLabel()
+        self.layout.addWidget(self.status_label)
+        self.setLayout(self.layout)
+
+    def refresh(self):
+        predictions = self.recognizer.get_predictions()
+        self.table.setRowCount(len(predictions))
+        for row, (device, (label, samples)) in enumerate(sorted(predictions.items(), key=lambda item: str(item[0]))):
+            self.table.setItem(row, 0, QtGui.QTableWidgetItem(str(device)))
+            self.table.setItem(row, 1, QtGui.QTableWidgetItem("" if label is None else str(label)))
+            self.table.setItem(row, 2, QtGui.QTableWidgetItem(str(samples)))
+
+        counters = self.recognizer.get_counters()
+        status = f"{counters['devices']} device(s), {counters['received']} packets received, " \
+                 f"{counters['dropped']} dropped, {counters['dropped_chunks']} chunks dropped"
+        if counters['dead_workers']:
+            status += f", {counters['dead_workers']} worker(s) stopped"
+        self.status_label.setText(status)
+
+
+def wait_for_classifier(classifier_node):
+    """
+    Waits until the ClassifierNode has loaded or trained its classifier and returns the one it predicts with (the
+    compiled svm, so the workers do not need scikit-learn). It is not fitted if there are no recordings yet and None
+    if the training failed, see is_fitted().
+    """
+    classifier_node.wait_for_training()
+    return classifier_node.predictor
@@ -0,0 +1,314 @@
+"""
+Binary storage for the recorded activities.
+
+Every activity is stored column-wise in a single .npy file with one row per recorded channel (see CHANNELS) and all
+recordings of this activity appended one after another. An index.json next to them maps the activity names to their
+files and remembers where each recording starts and how long it is. Loading the store therefore needs no parsing at
+all and the arrays can be memory-mapped instead of being read into memory.
+
+New recordings are not written into the activity files right away but appended to a journal (and synced to disk),
+so saving a recording costs time proportional to its size only. When the store is opened, the journal is replayed
+on top of the activity files. Once the journal has grown large compared to them, it is compacted: the recordings in
+it are merged into the activity files and the index, and the journal is emptied.
+"""
+
+import hashlib
+import json
+import os
+import pathlib
+import struct
+import zlib
+import numpy as np
+
+
+# the recorded channels in the order of the rows of the stored arrays, named like the columns of the old csv format
+CHANNELS = ("data_avg", "data_x", "data_y", "data_z")
+
+# length of the spectra in recordings without this information, e.g. the ones migrated from the csv which were all
+# made with the default buffer of 32 samples
+DEFAULT_WINDOW = 15
+
+INDEX_FILE_NAME = "index.json"
+INDEX_VERSION = 1
+
+JOURNAL_FILE_NAME = "journal.bin"
+# the journal is compacted once it is larger than this share of the activity files (and at least COMPACT_MIN_BYTES),
+# so rewriting the activity files costs amortized time proportional to the size of the new recordings only
+COMPACT_RATIO = 0.5
+COMPACT_MIN_BYTES = 1 << 20
+
+# every journal record is this header followed by the metadata as json and the (len(CHANNELS), length) float64 data
+_RECORD_HEADER = struct.Struct("<4sIQI")  # magic, length of the metadata, length of the data, crc32 of both
+_RECORD_MAGIC = b"RJ01"
+
+
+def _read_journal(journal_file):
+    """
+    Yields the metadata, the data and the end offset of every complete record of the journal. Reading stops at the
+    first incomplete or damaged record, e.g. one that was being written when the program stopped.
+    """
+    offset = 0
+    while True:
+        header = journal_file.read(_RECORD_HEADER.size)
+        if len(header) < _RECORD_HEADER.size:
+            return
+        magic, meta_length, data_length, checksum = _RECORD_HEADER.unpack(header)
+        if magic != _RECORD_MAGIC:
+            return
+        payload = journal_file.read(meta_length + data_length)
+        if len(payload) < meta_length + data_length or zlib.crc32(payload) != checksum:
+            return
+
+        offset += len(header) + len(payload)
+        meta = json.loads(payload[:meta_length].decode("utf-8"))
+        data = np.frombuffer(payload, dtype=float, offset=meta_length).reshape(len(CHANNELS), -1)
+        yield meta, data, offset
+
+
+def _fsync(file):
+    file.flush()
+    os.fsync(file.fileno())
+
+
+def _fsync_directory(folder):
+    # makes new and replaced files in the folder durable; not possible (and not needed) on windows
+    if os.name == "nt":
+        return
+    fd = os.open(folder, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class RecordingStore:
+    """
+    Stores the recorded activities as binary numpy arrays in the given folder.
+    """
+
+    def __init__(self, folder, mmap=True):
+        self.__folder = pathlib.Path(folder)
+        self.__index_path = self.__folder / INDEX_FILE_NAME
+        self.__journal_path = self.__folder / JOURNAL_FILE_NAME
+        self.__mmap_mode = "r" if mmap else None
+        self.__arrays = {}  # activity name -> loaded (or memory-mapped) array; filled on first access
+        self.__pending = {}  # activity name -> list of the journaled recordings not compacted yet
+        self.__journal_size = 0
+
+        if self.__index_path.exists():
+            with open(self.__index_path, encoding="utf-8") as index_file:
+                self.__index = json.load(index_file)
+        else:
+            self.__index = {"version": INDEX_VERSION, "activities": {}}
+        # sequence number of the last journal record; the index remembers the last one that was compacted
+        self.__journal_seq = self.__index.get("journal_seq", 0)
+        self.__replay_journal()
+
+    @property
+    def folder(self):
+        return self.__folder
+
+    def exists(self):
+        return self.__index_path.exists() or self.__journal_path.exists()
+
+    def is_empty(self):
+        return len(self.__index["activities"]) == 0
+
+    def activities(self):
+        return list(self.__index["activities"].keys())
+
+    def recordings(self, activity):
+        """
+        Returns a list of (offset, length, window) tuples for all recordings of the given activity, window being the
+        length of the single spectra the recording consists of.
+        """
+        return [(recording[0], recording[1], recording[2] if len(recording) > 2 else DEFAULT_WINDOW)
+                for recording in self.__index["activities"][activity]["recordings"]]
+
+    def iter_recordings(self, activity, channels=CHANNELS):
+        """
+        Yields the data of every recording of the given activity as (len(channels), length) array together with the
+        window length of the recording.
+        """
+        rows = [CHANNELS.index(channel) for channel in channels]
+        data = self.get_activity_data(activity)
+        for offset, length, window in self.recordings(activity):
+            yield data[rows, offset:offset + length], window
+
+    def get_activity_data(self, activity, channel=None):
+        """
+        Returns all recordings of the given activity as one (len(CHANNELS), n) array or, if a channel name is given,
+        only the corresponding row of it.
+        """
+        if activity not in self.__arrays:
+            parts = list(self.__pending.get(activity, []))
+            stored_length = self.__stored_length(activity)
+            if stored_length > 0:
+                file_path = self.__folder / self.__index["activities"][activity]["file"]
+                # the file may be longer than the index says if compacting was interrupted before the index was written
+                parts.insert(0, np.load(file_path, mmap_mode=self.__mmap_mode)[:, :stored_length])
+            self.__arrays[activity] = parts[0] if len(parts) == 1 else np.concatenate(parts, axis=1)
+
+        data = self.__arrays[activity]
+        return data if channel is None else data[CHANNELS.index(channel)]
+
+    def content_hash(self):
+        """
+        Returns a hash over all recordings and their data, i.e. over the complete content of the store. It does not
+        depend on whether the recordings are still in the journal or already compacted.
+        """
+        content_hash = hashlib.sha256()
+        recordings = {activity: self.recordings(activity) for activity in self.activities()}
+        content_hash.update(json.dumps(recordings, sort_keys=True).encode("utf-8"))
+        for activity in self.activities():
+            content_hash.update(np.ascontiguousarray(self.get_activity_data(activity)))
+        return content_hash.hexdigest()
+
+    def add_recording(self, activity, data_avg, data_x, data_y, data_z, window=DEFAULT_WINDOW, sync=True):
+        """
+        Appends a new recording to the given activity by writing it to the journal, which is synced to disk unless
+        sync is False. The data of every channel is the concatenation of the spectra of length window.
+        """
+        new_data = np.array([data_avg, data_x, data_y, data_z], dtype=float)
+        self.__journal_seq += 1
+        self.__append_to_journal({"seq": self.__journal_seq, "activity": activity, "window": int(window)}, new_data,
+                                 sync)
+        self.__apply(activity, new_data, window)
+
+        stored_bytes = sum(self.__stored_length(activity) for activity in self.activities()) * len(CHANNELS) * 8
+        if self.__journal_size > max(COMPACT_MIN_BYTES, COMPACT_RATIO * stored_bytes):
+            self.compact()
+
+    def compact(self):
+        """
+        Merges the recordings of the journal into the activity files and the index and empties the journal.
+        """
+        if not self.__pending and not self.__journal_size:
+            return
+
+        for activity in self.__pending:
+            self.__write_array(self.__index["activities"][activity]["file"],
+                               np.asarray(self.get_activity_data(activity)))
+        self.__index["journal_seq"] = self.__journal_seq
+        self.__write_index()
+        _fsync_directory(self.__folder)
+
+        # everything in the journal is in the activity files now (records up to journal_seq are skipped on replay,
+        # so stopping before the journal is emptied does no harm)
+        with open(self.__journal_path, "wb") as journal_file:
+            _fsync(journal_file)
+        self.__journal_size = 0
+
+        # reload lazily so memory-mapped arrays point to the new files
+        for activity in self.__pending:
+            self.__arrays.pop(activity, None)
+        self.__pending = {}
+
+    def __replay_journal(self):
+        if not self.__journal_path.exists():
+            return
+
+        with open(self.__journal_path, "rb") as journal_file:
+            for meta, data, end in _read_journal(journal_file):
+                if meta["seq"] > self.__journal_seq:
+                    self.__apply(meta["activity"], data, meta["window"])
+                    self.__journal_seq = meta["seq"]
+                self.__journal_size = end
+
+        # cut off a damaged record at the end so new records are appended right after the last complete one
+        if self.__journal_path.stat().st_size > self.__journal_size:
+            os.truncate(self.__journal_path, self.__journal_size)
+
+    def __append_to_journal(self, meta, data, sync):
+        meta_bytes = json.dumps(meta).encode("utf-8")
+        payload = meta_bytes + data.tobytes()
+        header = _RECORD_HEADER.pack(_RECORD_MAGIC, len(meta_bytes), len(payload) - len(meta_bytes),
+                                     zlib.crc32(payload))
+
+        self.__folder.mkdir(parents=True, exist_ok=True)
+        created = not self.__journal_path.exists()
+        with open(self.__journal_path, "ab") as journal_file:
+            journal_file.write(header + payload)
+            if sync:
+                _fsync(journal_file)
+        if created and sync:
+            _fsync_directory(self.__folder)
+        self.__journal_size += len(header) + len(payload)
+
+    def __apply(self, activity, data, window):
+        # adds a journaled recording to the index in memory; it is written to the index file when compacting
+        activities = self.__index["activities"]
+        if activity not in activities:
+            activities[activity] = {"file": self.__new_file_name(), "recordings": []}
+        recordings = activities[activity]["recordings"]
+        offset = recordings[-1][0] + recordings[-1][1] if recordings else 0
+        recordings.append([int(offset), int(data.shape[1]), int(window)])
+
+        self.__pending.setdefault(activity, []).append(data)
+        self.__arrays.pop(activity, None)
+
+    def __stored_length(self, activity):
+        # number of columns of the activity that are in its file (and not in the journal)
+        recordings = self.__index["activities"][activity]["recordings"]
+        length = recordings[-1][0] + recordings[-1][1] if recordings else 0
+        return length - sum(data.shape[1] for data in self.__pending.get(activity, []))
+
+    def __new_file_name(self):
+        existing_files = {entry["file"] for entry in self.__index["activities"].values()}
+        number = len(existing_files)
+        while f"activity_{number}.npy" in existing_files:
+            number += 1
+        return f"activity_{number}.npy"
+
+    def __write_array(self, file_name, data):
+        self.__folder.mkdir(parents=True, exist_ok=True)
+        # write to a temporary file first so a crash never leaves a half written file behind
+        tmp_path = self.__folder / (file_name + ".tmp")
+        with open(tmp_path, "wb") as array_file:
+            np.save(array_file, data)
+            _fsync(array_file)
+        os.replace(tmp_path, self.__folder / file_name)
+
+    def __write_index(self):
+        self.__folder.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.__index_path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as index_file:
+            json.dump(self.__index, index_file, indent=2)
+            _fsync(index_file)
+        os.replace(tmp_path, self.__index_path)
+
+
+def migrate_csv(csv_path, folder):
+    """
+    One-shot migration of a recording.csv (columns "activity" and the CHANNELS, every cell containing a python list)
+    into a binary RecordingStore in the given folder. Returns the new store.
+    """
+    recordings = []
+    with open(csv_path, encoding="utf-8") as csv_file:
+        header = csv_file.readline().strip().split(";")
+        for line in csv_file:
+            if not line.strip():
+                continue
+            row = dict(zip(header, line.strip().split(";")))
+            # parse the string by removing the brackets (this way we can use np.fromstring)
+            channels = [np.fromstring(row[channel][1:-1], dtype=float, sep=',') for channel in CHANNELS]
+            recordings.append((row["activity"], channels))
+
+    # only write the store after the whole file was parsed successfully
+    store = RecordingStore(folder)
+    for activity, channels in recordings:
+        store.add_recording(activity, *channels, sync=False)
+    store.compact()
+    return store
+
+
+def open_store(folder, csv_path=None):
+    """
+    Opens the recording store in the given folder; if there is none yet but an old csv file exists, the csv is
+    migrated first.
+    """
+    store = RecordingStore(folder)
+    if not store.exists() and csv_path is not None and pathlib.Path(csv_path).exists():
+        print(f"Migrating {csv_path} to the binary recording store in {folder}...")
+        store = migrate_csv(csv_path, folder)
+    return store
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Headless replay of sensor data through the nodes of the activity recognizer.
+
+The same nodes as in the flowchart of activity_recognizer.py are used (the DIPPIDNode is replaced by the replayed
+data), but they are driven directly without a window and as fast as possible. At the end the throughput and the time
+spent in every stage is reported, so changes can be compared on a machine without a display (e.g. a CI server).
+
+Sources:
+- a recorded sensor stream: .npy file with shape (n, 3) or .csv file with the columns x, y and z
+- the recording store: the stored spectra are replayed through the classifier only
+- a synthetic stream of the given number of samples
+"""
+
+import os
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")  # no display needed
+
+import json
+import time
+from argparse import ArgumentParser
+from collections import defaultdict
+from pyqtgraph.Qt import QtGui
+from FFT_node import MultiChannelFFTNode
+from Classifier_node import ClassifierNode, Mode
+from DisplayText_node import DisplayTextNode
+from sensor_streams import load_stream, synthetic_stream
+
+
+class StageTimer:
+    """
+    Measures the number of calls and the time spent in every stage of the pipeline.
+    """
+
+    def __init__(self):
+        self.calls = defaultdict(int)
+        self.durations = defaultdict(float)
+
+    def run(self, stage, function, **kwds):
+        start = time.perf_counter()
+        result = function(**kwds)
+        self.durations[stage] += time.perf_counter() - start
+        self.calls[stage] += 1
+        return result
+
+    def report(self, count, total_duration, unit="samples"):
+        """
+        Returns the throughput of the count replayed samples (or windows, see unit) and the durations of the stages.
+        """
+        return {
+            "unit": unit,
+            unit: count,
+            "duration": total_duration,
+            f"{unit}_per_second": count / total_duration if total_duration > 0 else 0.0,
+            "stages": {stage: {"calls": self.calls[stage], "total": self.durations[stage],
+                               "mean": self.durations[stage] / self.calls[stage]}
+                       for stage in self.calls},
+        }
+
+
+class ReplayPipeline:
+    """
+    The fft, classifier and display node of the activity recognizer, connected like in the flowchart.
+    """
+
+    def __init__(self, continuous_prediction=True):
+        self.fft_node = MultiChannelFFTNode("fft")
+        self.classifier_node = ClassifierNode("classifier")
+        self.display_node = DisplayTextNode("display")
+        self.timer = StageTimer()
+
+        # the classifier node loads its cached classifier or trains a new one in the background
+        self.classifier_node.wait_for_training()
+
+        # classify every window like in the continuous prediction mode (or only record the windows)
+        self.classifier_node.mode_selection.setCurrentText(Mode.PREDICT.value)
+        self.classifier_node.continuous_checkbox.setChecked(continuous_prediction)
+        self.classifier_node.toggle_prediction_recording()
+
+    def process_samples(self, chunk):
+        """
+        Processes a (n, 3) chunk of accelerometer values like a single output of the DIPPIDNode.
+        """
+        spectra = self.timer.run("fft", self.fft_node.process, accelX=chunk[:, 0], accelY=chunk[:, 1],
+                                 accelZ=chunk[:, 2])
+        self.process_spectra(frames=spectra["framesOut"])
+
+    def process_spectra(self, spectra=None, frames=None):
+        prediction = self.timer.run("classifier", self.classifier_node.process, valX=None, valY=None, valZ=None,
+                                    spectra=spectra, frames=frames)
+        self.timer.run("display", self.display_node.process, prediction=prediction["prediction"])
+
+
+def replay_stream(pipeline, samples, chunk_size=1):
+    start = time.perf_counter()
+    for i in range(0, len(samples), chunk_size):
+        pipeline.process_samples(samples[i:i + chunk_size])
+    return pipeline.timer.report(len(samples), time.perf_counter() - start)
+
+
+def replay_store(pipeline):
+    store = pipeline.classifier_node.recording_store
+    windows = 0
+
+    start = time.perf_counter()
+    for activity in store.activities():
+        for recording, window in store.iter_recordings(activity, ("data_x", "data_y", "data_z")):
+            n_windows = recording.shape[1] // window
+            for spectra in recording[:, :n_windows * window].reshape(3, n_windows, window).transpose(1, 0, 2):
+                pipeline.process_spectra(spectra)
+            windows += n_windows
+    return pipeline.timer.report(windows, time.perf_counter() - start, unit="windows")
+
+
+def print_report(report):
+    unit = report["unit"]
+    print(f"Replayed {report[unit]} {unit} in {report['duration']:.3f} s ({report[f'{unit}_per_second']:.0f} {unit}/s)")
+    for stage, stats in report["stages"].items():
+        print(f"  {stage:<12} {stats['calls']:>8} calls  {stats['total'] * 1000:>10.1f} ms total  "
+              f"{stats['mean'] * 1e6:>8.1f} us/call")
+
+
+def main():
+    parser = ArgumentParser(description="Replays sensor data headless through the nodes of the activity recognizer "
+                                        "as fast as possible and reports the throughput.")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--stream", help="A recorded accelerometer stream (.npy with shape (n, 3) or .csv with the "
+                                         "columns x, y, z)")
+    source.add_argument("--store", action="store_true", help="Replay the spectra of the recording store through "
+                                                             "the classifier")
+    source.add_argument("--synthetic", type=int, metavar="SAMPLES", help="Replay a synthetic stream of this length")
+    parser.add_argument("--chunk-size", type=int, default=1, help="Samples passed to the pipeline at once")
+    parser.add_argument("--record-only", action="store_true", help="Only record the windows instead of classifying "
+                                                                   "every one of them")
+    parser.add_argument("--json", help="Write the report to this json file")
+    args = parser.parse_args()
+
+    app = QtGui.QApplication([])
+    pipeline = ReplayPipeline(continuous_prediction=not args.record_only)
+
+    if args.store:
+        report = replay_store(pipeline)
+    else:
+        samples = load_stream(args.stream) if args.stream else synthetic_stream(args.synthetic)
+        report = replay_stream(pipeline, samples, args.chunk_size)
+
+    print_report(report)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as json_file:
+            json.dump(report, json_file, indent=2)
+
+    pipeline.classifier_node.training_worker.shutdown()
+    app.quit()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+import numpy as np
+
+
+class RingBuffer:
+    """
+    Preallocated circular buffer for one or more channels of samples.
+
+    Every sample is stored twice: at its position i in the ring and again at i + size. This way the last `size`
+    samples always lie next to each other in memory and can be returned in chronological order as a numpy view
+    instead of a copy. Inserting a single sample is O(1), inserting a chunk of n samples is O(n).
+    """
+
+    def __init__(self, size, channels=None, dtype=float):
+        if size < 1:
+            raise ValueError(f"The size of a ring buffer has to be at least 1 but was {size}!")
+
+        self._size = int(size)
+        self._channels = channels
+        shape = (2 * self._size,) if channels is None else (channels, 2 * self._size)
+        self._data = np.zeros(shape, dtype=dtype)
+        self._index = 0  # the position in the ring the next sample will be written to
+        self._count = 0  # the number of valid samples, never larger than the size
+
+    @property
+    def size(self):
+        return self._size
+
+    @property
+    def channels(self):
+        return self._channels
+
+    def __len__(self):
+        return self._count
+
+    def is_full(self):
+        return self._count == self._size
+
+    def clear(self):
+        self._index = 0
+        self._count = 0
+
+    def append(self, value):
+        """
+        Inserts a single sample. For a multi-channel buffer the value has to contain one entry per channel.
+        """
+        i = self._index
+        self._data[..., i] = value
+        self._data[..., i + self._size] = value
+
+        self._index = (i + 1) % self._size
+        self._count = min(self._count + 1, self._size)
+
+    def extend(self, values):
+        """
+        Inserts a chunk of samples at once. The samples are expected along the last axis, i.e. with shape (n,) for a
+        single-channel buffer and (channels, n) for a multi-channel one. Only the last `size` samples of a chunk
+        that is larger than the buffer are kept.
+        """
+        values = np.asarray(values, dtype=self._data.dtype)
+        if self._channels is None:
+            values = values.reshape(-1)
+        else:
+            values = values.reshape(self._channels, -1)
+
+        n = values.shape[-1]
+        if n == 0:
+            return
+
+        if n > self._size:
+            values = values[..., -self._size:]
+            n = self._size
+
+        start = self._index
+        first = min(n, self._size - start)  # the part that fits in before the ring wraps around
+        rest = n - first
+
+        self._data[..., start:start + first] = values[..., :first]
+        self._data[..., start + self._size:start + self._size + first] = values[..., :first]
+        if rest:
+            self._data[..., :rest] = values[..., first:]
+            self._data[..., self._size:self._size + rest] = values[..., first:]
+
+        self._index = (start + n) % self._size
+        self._count = min(self._count + n, self._size)
+
+    def view(self):
+        """
+        Returns the buffered samples from oldest to newest as a read-only view into the buffer (no copy is made).
+        The view is only valid until the next insert; use `copy()` if the values have to be kept.
+        """
+        end = self._index + self._size
+        window = self._data[..., end - self._count:end]
+        window.flags.writeable = False
+        return window
+
+    def copy(self):
+        return np.array(self.view())
+
+    def resize(self, size):
+        """
+        Changes the capacity of the buffer while keeping the most recent samples.
+        """
+        samples = self.copy()
+        self.__init__(size, self._channels, self._data.dtype)
+        self.extend(samples)
@@ -0,0 +1,27 @@
+"""
+Accelerometer streams used to replay or simulate sensor data without a device.
+"""
+
+import numpy as np
+
+
+def load_stream(path):
+    """
+    Loads a recorded accelerometer stream as (n, 3) array from a .npy file or a .csv file with the columns x, y and z.
+    """
+    if str(path).endswith(".npy"):
+        return np.load(path)
+
+    data = np.genfromtxt(path, delimiter=",", names=True)
+    return np.stack([data["x"], data["y"], data["z"]], axis=1)
+
+
+def synthetic_stream(n_samples, sample_rate=100, seed=0):
+    """
+    Creates an accelerometer stream which switches between a few periodic movements every five seconds.
+    """
+    rng = np.random.default_rng(seed)
+    t = np.arange(n_samples) / sample_rate
+    frequencies = rng.uniform(0.5, 10, size=(n_samples // (5 * sample_rate) + 1, 3))
+    segment_frequencies = frequencies[(t // 5).astype(int)]
+    return np.sin(2 * np.pi * segment_frequencies * t[:, np.newaxis]) + rng.normal(0, 0.1, size=(n_samples, 3))
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Measures how long the activity recognizer takes to start.
+
+The recognizer is started several times in a new process with --startup-benchmark. For every run the time from
+starting the process until the window is shown (time-to-first-window) and until the classifier is loaded or trained
+in the background is measured. By default the window is rendered offscreen, so no display is needed.
+"""
+
+import json
+import os
+import pathlib
+import statistics
+import subprocess
+import sys
+import time
+from argparse import ArgumentParser
+
+
+EVENTS = ("window_shown", "classifier_ready")
+
+
+def measure_startup(timeout=120, offscreen=True):
+    """
+    Starts the recognizer once and returns the seconds until each of the EVENTS.
+    """
+    env = dict(os.environ)
+    if offscreen:
+        env["QT_QPA_PLATFORM"] = "offscreen"
+
+    script = pathlib.Path(__file__).with_name("activity_recognizer.py")
+    start = time.perf_counter()
+    process = subprocess.Popen([sys.executable, str(script), "--startup-benchmark"], cwd=script.parent, env=env,
+                               stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+    times = {}
+    try:
+        for line in process.stdout:
+            event = line.strip()
+            if event in EVENTS and event not in times:
+                times[event] = time.perf_counter() - start
+            if len(times) == len(EVENTS):
+                break
+        process.wait(timeout=timeout)
+    finally:
+        if process.poll() is None:
+            process.kill()
+    return times
+
+
+def main():
+    parser = ArgumentParser(description="Measures the time-to-first-window of the activity recognizer.")
+    parser.add_argument("-n", "--runs", type=int, default=5, help="Number of starts")
+    parser.add_argument("--display", action="store_true", help="Show the window on the display instead of "
+                                                                "rendering it offscreen")
+    parser.add_argument("--json", help="Write the results to this json file")
+    args = parser.parse_args()
+
+    runs = [measure_startup(offscreen=not args.display) for _ in range(args.runs)]
+    report = {"runs": runs}
+    for event in EVENTS:
+        values = [run[event] for run in runs if event in run]
+        if values:
+            report[event] = {"median": statistics.median(values), "min": min(values), "max": max(values)}
+            print(f"{event:<18} median {report[event]['median']:.3f} s  min {report[event]['min']:.3f} s  "
+                  f"max {report[event]['max']:.3f} s")
+        else:
+            print(f"{event:<18} not reached")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as json_file:
+            json.dump(report, json_file, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+from collections import Counter, deque
+import time
+import numpy as np
+from feature_extraction import extract_features
+
+
+class StreamingPredictor:
+    """
+    Classifies every new window of spectra as it arrives and smooths the predicted labels with a vote over the last
+    `window_count` windows. The smoothed label only switches to another activity if that activity got at least
+    `min_votes` of these votes (hysteresis), so single outliers do not make the prediction flicker.
+
+    The time needed for every window (feature extraction, classification and voting) is measured and compared to the
+    latency budget; get_latency_stats() returns the statistics over the last measurements. Windows classified together
+    in a chunk are only done when the whole chunk is, so each of them gets the duration of the chunk as its latency;
+    the cost per window (the duration divided over the windows) is reported separately.
+    """
+
+    def __init__(self, window_count=5, min_votes=3, latency_budget=0.005, stats_size=1000):
+        self.window_count = window_count
+        self.min_votes = min_votes
+        self.latency_budget = latency_budget  # in seconds
+
+        self._votes = deque(maxlen=window_count)
+        self._latencies = deque(maxlen=stats_size)
+        self._costs = deque(maxlen=stats_size)
+        self._windows = 0
+        self._windows_over_budget = 0
+        self._label = None
+        self._window_length = 0
+
+    @property
+    def window_count(self):
+        return self._window_count
+
+    @window_count.setter
+    def window_count(self, window_count):
+        if window_count < 1:
+            raise ValueError(f"At least one window is needed for the vote but was {window_count}!")
+        self._window_count = int(window_count)
+        self._votes = deque(getattr(self, "_votes", ()), maxlen=self._window_count)
+
+    def reset(self):
+        self._votes.clear()
+        self._latencies.clear()
+        self._costs.clear()
+        self._windows = 0
+        self._windows_over_budget = 0
+        self._label = None
+        self._window_length = 0
+
+    def update(self, classifier, spectra):
+        """
+        Classifies the given (3, n) spectra of a single window and returns the smoothed label.
+        Spectra shorter than the ones before (while the buffer is still filling up) are not classified.
+        """
+        return self.update_chunk(classifier, np.asarray(spectra)[np.newaxis])
+
+    def update_chunk(self, classifier, frames):
+        """
+        Classifies the (windows, 3, n) spectra of consecutive windows with a single prediction and votes on them in
+        order; returns the smoothed label after the last window.
+        """
+        start = time.perf_counter()
+
+        frames = np.asarray(frames)
+        if len(frames) == 0 or frames.shape[-1] < self._window_length:
+            return self._label
+        self._window_length = frames.shape[-1]
+
+        features = extract_features(frames.transpose(1, 0, 2))
+        for label in classifier.predict(features):
+            self._votes.append(label)
+
+            leader, votes = Counter(self._votes).most_common(1)[0]
+            if self._label is None or (leader != self._label and votes >= min(self.min_votes, self._votes.maxlen)):
+                self._label = leader
+
+        latency = time.perf_counter() - start
+        self._latencies.extend([latency] * len(frames))
+        self._costs.extend([latency / len(frames)] * len(frames))
+        self._windows += len(frames)
+        if latency > self.latency_budget:
+            self._windows_over_budget += len(frames)
+
+        return self._label
+
+    def get_window_count(self):
+        return self._windows
+
+    def get_latency_stats(self):
+        """
+        Returns the number of classified windows, how many of them exceeded the latency budget and the mean, 95th
+        percentile and maximum latency and the mean cost per window (in seconds) of the last measurements.
+        """
+        latencies = np.array(self._latencies)
+        costs = np.array(self._costs)
+        return {
+            "windows": self._windows,
+            "windows_over_budget": self._windows_over_budget,
+            "budget": self.latency_budget,
+            "mean": float(latencies.mean()) if len(latencies) else 0.0,
+            "p95": float(np.percentile(latencies, 95)) if len(latencies) else 0.0,
+            "max": float(latencies.max()) if len(latencies) else 0.0,
+            "cost": float(costs.mean()) if len(costs) else 0.0,
+        }
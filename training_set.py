@@ -0,0 +1,187 @@
+"""
+Bounded, class-balanced training set for the classifiers.
+
+Instead of training on every window ever recorded, at most `cap` feature vectors are kept per activity. They are
+chosen by reservoir sampling, so every window of an activity has the same chance to be in the training set no matter
+when it was recorded, and an activity recorded for a long time does not dominate the others. The reservoirs are
+updated with the new recordings of the store only and saved next to the model cache, so loading the training set
+takes time proportional to the new recordings and fitting takes time proportional to the cap.
+"""
+
+import json
+import numpy as np
+from feature_extraction import FEATURE_NAMES, extract_features
+
+
+DEFAULT_CAP = 1000  # windows per activity
+TRAINING_SET_VERSION = 2
+
+
+def recording_features(recording, window):
+    """
+    Returns the feature vectors of all windows of a (3, length) recording of spectra of the given window length.
+    """
+    # the spectra of a recording are stored one after another, so they can be split up into the windows
+    n_windows = recording.shape[1] // window
+    return extract_features(np.asarray(recording[:, :n_windows * window]).reshape(3, n_windows, window))
+
+
+class BalancedTrainingSet:
+    """
+    One reservoir of at most `cap` feature vectors per activity (stratified reservoir sampling, algorithm R).
+    """
+
+    def __init__(self, cap=DEFAULT_CAP, seed=0):
+        if cap < 1:
+            raise ValueError(f"At least one window per activity is needed but the cap was {cap}!")
+        self.cap = int(cap)
+        self._seed = seed
+        self.reset()
+
+    def reset(self):
+        self._rng = np.random.default_rng(self._seed)
+        self._reservoirs = {}  # activity -> (<= cap, features) array
+        self._origins = {}  # activity -> (<= cap, 2) array of the recording and the window index of every vector
+        self._seen = {}  # activity -> number of windows offered to the reservoir so far
+        self._consumed = {}  # activity -> recordings of the store already added, as [offset, length, window]
+
+    def add(self, activity, features, recording=-1):
+        """
+        Offers the feature vectors of the consecutive windows of a new recording of the given activity to its
+        reservoir; recording is the index of the recording in the store (see get_origins()).
+        """
+        reservoir = self._reservoirs.get(activity, np.empty((0, len(FEATURE_NAMES))))
+        origins = self._origins.get(activity, np.empty((0, 2), dtype=int))
+        seen = self._seen.get(activity, 0)
+        new_origins = np.column_stack([np.full(len(features), recording), np.arange(len(features))])
+
+        # as long as the reservoir is not full, every window is taken
+        free = self.cap - len(reservoir)
+        if free > 0:
+            reservoir = np.concatenate([reservoir, features[:free]])
+            origins = np.concatenate([origins, new_origins[:free]])
+            seen += len(features[:free])
+            features, new_origins = features[free:], new_origins[free:]
+
+        if len(features):
+            # the i-th window seen replaces a random one of the reservoir with probability cap / i
+            positions = self._rng.integers(0, seen + np.arange(1, len(features) + 1))
+            replaced = positions < self.cap
+            # if a position is drawn several times, the last (i.e. latest) window is kept like in the sequential form
+            reservoir[positions[replaced]] = features[replaced]
+            origins[positions[replaced]] = new_origins[replaced]
+            seen += len(features)
+
+        self._reservoirs[activity] = reservoir
+        self._origins[activity] = origins
+        self._seen[activity] = seen
+
+    def update(self, store):
+        """
+        Adds the recordings of the store which were not added yet and returns their number. If the store does not
+        start with the recordings added before (e.g. it was replaced), the training set is rebuilt from scratch.
+        """
+        if any(not self.__is_prefix(activity, store) for activity in self._consumed):
+            self.reset()
+
+        added = 0
+        for activity in store.activities():
+            consumed = self._consumed.setdefault(activity, [])
+            recordings = store.recordings(activity)
+            data = store.iter_recordings(activity, ("data_x", "data_y", "data_z"))
+            for i, (recording, window) in enumerate(data):
+                if i < len(consumed):
+                    continue
+                self.add(activity, recording_features(recording, window), recording=i)
+                consumed.append(list(recordings[i]))
+                added += 1
+        return added
+
+    def __is_prefix(self, activity, store):
+        if activity not in store.activities():
+            return False
+        recordings = [list(recording) for recording in store.recordings(activity)]
+        return recordings[:len(self._consumed[activity])] == self._consumed[activity]
+
+    def get_data(self):
+        """
+        Returns the sampled feature vectors of all activities and their labels.
+        """
+        activities = sorted(self._reservoirs)
+        labels = [activity for activity in activities for _ in range(len(self._reservoirs[activity]))]
+        if not activities:
+            return np.empty((0, len(FEATURE_NAMES))), labels
+        return np.concatenate([self._reservoirs[activity] for activity in activities]), labels
+
+    def get_origins(self):
+        """
+        Returns the index of the recording (within its activity) and of the window (within its recording) of every
+        feature vector of get_data() as (n, 2) array, e.g. to keep overlapping windows apart when cross-validating.
+        """
+        activities = sorted(self._reservoirs)
+        if not activities:
+            return np.empty((0, 2), dtype=int)
+        return np.concatenate([self._origins[activity] for activity in activities])
+
+    def sample(self, size, rng=None):
+        """
+        Returns about `size` feature vectors drawn evenly from the reservoirs of all activities (at most all of an
+        activity) and their labels, e.g. to replay them together with new windows when training incrementally.
+        """
+        rng = np.random.default_rng() if rng is None else rng
+        activities = sorted(self._reservoirs)
+        if not activities or size <= 0:
+            return np.empty((0, len(FEATURE_NAMES))), []
+
+        per_activity = -(-size // len(activities))  # rounded up, so every activity gets the same share
+        samples, labels = [], []
+        for activity in activities:
+            reservoir = self._reservoirs[activity]
+            chosen = rng.choice(len(reservoir), min(per_activity, len(reservoir)), replace=False)
+            samples.append(reservoir[chosen])
+            labels += [activity] * len(chosen)
+        return np.concatenate(samples), labels
+
+    def save(self, path):
+        activities = sorted(self._reservoirs)
+        state = {
+            "version": TRAINING_SET_VERSION,
+            "cap": self.cap,
+            "activities": activities,
+            "seen": self._seen,
+            "consumed": self._consumed,
+            "rng": self._rng.bit_generator.state,
+        }
+        tmp_path = path.with_name(path.name + ".tmp")
+        with open(tmp_path, "wb") as training_set_file:
+            np.savez(training_set_file, state=json.dumps(state),
+                     **{f"reservoir_{i}": self._reservoirs[activity] for i, activity in enumerate(activities)},
+                     **{f"origins_{i}": self._origins[activity] for i, activity in enumerate(activities)})
+        tmp_path.replace(path)
+
+    @classmethod
+    def load(cls, path, cap=DEFAULT_CAP):
+        """
+        Returns the saved training set or None if there is none for this cap (or it is from another version).
+        """
+        if not path.is_file():
+            return None
+
+        try:
+            with np.load(path) as saved:
+                state = json.loads(str(saved["state"]))
+                if state["version"] != TRAINING_SET_VERSION or state["cap"] != cap:
+                    return None
+
+                training_set = cls(cap)
+                training_set._rng.bit_generator.state = state["rng"]
+                training_set._reservoirs = {activity: saved[f"reservoir_{i}"]
+                                            for i, activity in enumerate(state["activities"])}
+                training_set._origins = {activity: saved[f"origins_{i}"]
+                                         for i, activity in enumerate(state["activities"])}
+        except (OSError, ValueError, KeyError):
+            return None
+
+        training_set._seen = state["seen"]
+        training_set._consumed = state["consumed"]
+        return training_set
@@ -0,0 +1,58 @@
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+from pyqtgraph.Qt import QtCore
+
+
+class TrainingWorker(QtCore.QObject):
+    """
+    Runs the training of a classifier in a background thread so the ui (and the sensor input) is not blocked while
+    fitting. Progress messages and the trained classifier are reported back via qt signals, which are delivered in
+    the thread of the receiver, i.e. the ui thread.
+    Only one training runs at a time; further jobs are queued. Every job gets an id, which is reported together with
+    its result, so the receiver can tell the results of outdated jobs apart. A job only counts as done once its result
+    was delivered, i.e. is_running() is True until the slots of finished or failed have run in the ui thread.
+    """
+    progress = QtCore.Signal(str)
+    finished = QtCore.Signal(int, object)  # the id of the job and the trained classifier
+    failed = QtCore.Signal(int, str)
+    _job_done = QtCore.Signal()  # emitted after the result, so it is handled after the slots receiving the result
+
+    def __init__(self):
+        QtCore.QObject.__init__(self)
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="training")
+        self._pending_jobs = 0
+        self._last_job = 0
+        self._lock = Lock()
+        self._job_done.connect(self.__on_job_done)
+
+    def is_running(self):
+        return self._pending_jobs > 0
+
+    def start(self, train_function):
+        """
+        Schedules the given function which has to accept a progress callback as keyword argument "progress" and
+        return the trained classifier. Returns the id of the job.
+        """
+        with self._lock:
+            self._pending_jobs += 1
+            self._last_job += 1
+            job = self._last_job
+        self._executor.submit(self.__run, job, train_function)
+        return job
+
+    def __run(self, job, train_function):
+        try:
+            classifier = train_function(progress=self.progress.emit)
+        except Exception as e:
+            self.failed.emit(job, f"{type(e).__name__}: {e}")
+        else:
+            self.finished.emit(job, classifier)
+        self._job_done.emit()
+
+    def __on_job_done(self):
+        # runs in the ui thread (the thread of this object) after the result was delivered there
+        with self._lock:
+            self._pending_jobs -= 1
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)